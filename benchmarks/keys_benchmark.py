@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Compare KeyBindings.get_handler's (context, key) table with the linear scan
+over every binding it replaced, for a mix of bound and unbound keys.
+
+    python benchmarks/keys_benchmark.py [number of keypresses]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from todotxt_machine.keys import KeyBindings  # noqa: E402
+
+
+def legacy_get_handler(key_bindings, key, context):
+    for name, data in key_bindings.key_bindings.items():
+        if key in data['keys'] and data['handler'] == context:
+            return data['callback'], data.get('kwargs', {})
+    return None, {}
+
+
+def keypresses(count):
+    # mostly characters typed while editing or searching, some commands
+    keys = [('a', 'todo:editing'), ('s', 'search'), ('j', 'listbox'),
+            ('enter', 'todo:editing'), ('x', 'todo'), ('z', 'listbox'),
+            ('e', 'edit'), ('q', 'listbox')]
+    return (keys * (count // len(keys) + 1))[:count]
+
+
+def best_of(func, repeat=3):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    key_bindings = KeyBindings({})
+    keys = keypresses(count)
+    for key, context in keys[:8]:
+        assert key_bindings.get_handler(key, context) == legacy_get_handler(key_bindings, key, context)
+
+    old = best_of(lambda: [legacy_get_handler(key_bindings, k, c) for k, c in keys])
+    new = best_of(lambda: [key_bindings.get_handler(k, c) for k, c in keys])
+
+    print("{0} keypresses, {1} bindings".format(count, len(key_bindings.key_bindings)))
+    print("get_handler   linear scan {0:8.3f}s ({1:6.2f}us/key)   table {2:8.3f}s ({3:6.2f}us/key)   {4:5.1f}x".format(
+        old, old / count * 1e6, new, new / count * 1e6, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Compare the single pass tokenizer used by Todos.parse_raw_entries with the
+regex cascade it replaced (six field scans plus seven body substitutions).
+
+    python benchmarks/parse_benchmark.py [number of lines]
+"""
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from todotxt_machine.todo import Todos, Todo  # noqa: E402
+
+
+def legacy_body(raw):
+    for regex in (Todos._context_regex, Todos._creation_date_regex,
+                  Todos._due_date_regex, Todos._priority_regex,
+                  Todos._project_regex, Todos._completed_regex,
+                  Todos._macro_regex):
+        raw = re.sub(regex, '', raw)
+    return raw.strip()
+
+
+def legacy_fields(line):
+    return (Todos.priority(line), Todos.contexts(line), Todos.projects(line),
+            Todos.creation_date(line), Todos.due_date(line),
+            Todos.completed_date(line), legacy_body(line.strip()))
+
+
+class LegacyTodos(Todos):
+    """Todos parsed the way parse_raw_entries used to do it"""
+
+    def create_todo(self, todo, index):
+        priority, contexts, projects, creation_date, due_date, completed_date, body = legacy_fields(todo)
+        return Todo(todo, index, priority=priority, contexts=contexts,
+                    projects=projects, creation_date=creation_date,
+                    due_date=due_date, completed_date=completed_date,
+                    body=body)
+
+
+def generate_lines(count, seed=0):
+    rng = random.Random(seed)
+    words = ['call', 'email', 'fix', 'review', 'the', 'deploy', 'report',
+             'meeting', 'with', 'team', 'about', 'budget', 'server', 'notes']
+    lines = []
+    for _ in range(count):
+        parts = []
+        if rng.random() < 0.2:
+            parts.append('x 2015-%02d-%02d' % (rng.randint(1, 12), rng.randint(1, 28)))
+        if rng.random() < 0.4:
+            parts.append('(%s)' % rng.choice('ABCD'))
+        if rng.random() < 0.5:
+            parts.append('2015-%02d-%02d' % (rng.randint(1, 12), rng.randint(1, 28)))
+        parts.extend(rng.choice(words) for _ in range(rng.randint(3, 10)))
+        parts.extend('+proj%d.sub%d' % (rng.randint(0, 30), rng.randint(0, 5))
+                     for _ in range(rng.randint(0, 2)))
+        parts.extend('@ctx%d' % rng.randint(0, 20) for _ in range(rng.randint(0, 2)))
+        if rng.random() < 0.3:
+            parts.append('due:2016-%02d-%02d' % (rng.randint(1, 12), rng.randint(1, 28)))
+        lines.append(' '.join(parts) + '\n')
+    return lines
+
+
+def best_of(func, repeat=3):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    lines = generate_lines(count)
+
+    fields_old = best_of(lambda: [legacy_fields(l) for l in lines])
+    fields_new = best_of(lambda: [Todos.parse(l) for l in lines])
+    entries_old = best_of(lambda: LegacyTodos(lines, None, None))
+    entries_new = best_of(lambda: Todos(lines, None, None))
+
+    print("{0} lines".format(count))
+    print("field extraction   regex cascade {0:8.3f}s   tokenizer {1:8.3f}s   {2:5.1f}x".format(
+        fields_old, fields_new, fields_old / fields_new))
+    print("parse_raw_entries  regex cascade {0:8.3f}s   tokenizer {1:8.3f}s   {2:5.1f}x".format(
+        entries_old, entries_new, entries_old / entries_new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Measure how long importing todotxt_machine.cli takes with python -X importtime
+and fail if it's over budget or pulls in modules only the curses UI needs.
+
+    python benchmarks/startup_benchmark.py [budget in ms]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# cumulative import time of todotxt_machine.cli, best of RUNS
+STARTUP_BUDGET_MS = 60
+RUNS = 5
+# only needed by `todotxt-machine curses`
+DEFERRED_MODULES = ('urwid', 'yaml', 'pkg_resources', 'todotxt_machine.widgets')
+
+
+def import_times():
+    """{module: (self us, cumulative us)} for one fresh interpreter"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import todotxt_machine.cli'],
+        stderr=subprocess.STDOUT, env=env).decode('utf-8')
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else STARTUP_BUDGET_MS
+    runs = [import_times() for _ in range(RUNS)]
+    best = min(runs, key=lambda times: times['todotxt_machine.cli'][1])
+    total = best['todotxt_machine.cli'][1] / 1000.0
+
+    print("import todotxt_machine.cli  {0:7.1f}ms  (budget {1:.0f}ms, best of {2})".format(total, budget, RUNS))
+    print("slowest imports:")
+    for name, (own, cumulative) in sorted(best.items(), key=lambda item: -item[1][0])[:10]:
+        print("  {0:7.1f}ms  {1}".format(own / 1000.0, name))
+
+    deferred = sorted(name for name in best for prefix in DEFERRED_MODULES
+                      if name == prefix or name.startswith(prefix + '.'))
+    if deferred:
+        print("imported at startup but only needed by the curses UI: {0}".format(', '.join(deferred)))
+    if deferred or total > budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
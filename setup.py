@@ -81,6 +81,6 @@ setup(name=NAME,
       tests_require=['pytest'],
       cmdclass={'test': PyTest},
       package_data={
-          '': ['*.yaml']
+          '': ['*.yaml', '*.txt']
       },
       )
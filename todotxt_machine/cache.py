@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding=utf-8
+import re
+from collections import OrderedDict
+
+_missing = object()
+
+
+class LRUCache(object):
+    """Bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+
+class PatternCache(LRUCache):
+    """Compiled regexes keyed by (pattern, flags), invalid patterns are cached as None"""
+
+    def compile(self, pattern, flags=0):
+        key = (pattern, flags)
+        compiled = self.get(key, _missing)
+        if compiled is _missing:
+            try:
+                compiled = re.compile(pattern, flags)
+            except re.error:
+                compiled = None
+            self[key] = compiled
+        return compiled
+
+
+# Shared by search validation, Todos.search and search match highlighting
+patterns = PatternCache(256)
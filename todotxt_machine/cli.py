@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 # coding=utf-8
 import argparse
+import errno
+import io
 import sys
 import os
 import random
+import signal
 from collections import OrderedDict
 
 # import ipdb; # ipdb.set_trace()
@@ -20,9 +23,20 @@ elif sys.version_info[0] < 3:
 
 import todotxt_machine
 from todotxt_machine.todo import Todos, Todo
-from todotxt_machine.widgets.main import UrwidUI
-from todotxt_machine.colorscheme import ColorScheme
-from todotxt_machine.keys import KeyBindings
+# urwid, PyYAML and the color schemes are only imported by the subcommands
+# that need them, `todotxt-machine add` shouldn't pay for the curses UI
+
+
+def stream_to_stdout(write):
+    """Call write(sys.stdout), quietly stopping if the reader goes away (| head)"""
+    try:
+        write(sys.stdout)
+        sys.stdout.flush()
+    except IOError as e:
+        if e.errno != errno.EPIPE:
+            raise
+        # keep the flush at exit from complaining too
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
 
 
 def exit_with_error(message):
@@ -59,12 +73,51 @@ def main():
     parser.add_argument('--config', nargs='?', default='~/.todotxt-machinerc')
     parser.add_argument('--version', action='version', version=todotxt_machine.version)
     parser.add_argument('--show-default-bindings', action='store_true', default=False)
+    parser.add_argument('--no-daemon', action='store_true', default=False,
+                        help="read the todo file even if a daemon is serving it")
 
     subparsers = parser.add_subparsers(dest='subparser_name', help='sub-command help')
 
     subparser = subparsers.add_parser('curses')
     subparser = subparsers.add_parser('add')
     subparser.add_argument('body')
+    subparser.add_argument('--creation-date', action='store_true', default=False,
+                           help="prefix the todo with today's date")
+    subparser = subparsers.add_parser('import')
+    subparser.add_argument('file', nargs='?', default='-',
+                           help="file with one todo per line, - for stdin (the default)")
+    subparser.add_argument('--format', choices=['todotxt', 'jsonl', 'csv'], default='todotxt',
+                           help="read todo.txt lines (the default) or records written by export")
+    subparser.add_argument('--creation-date', action='store_true', default=False,
+                           help="prefix each todo with today's date")
+    subparser = subparsers.add_parser('export')
+    subparser.add_argument('file', nargs='?',
+                           help="todo.txt file to export, the todo file by default")
+    subparser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    subparser = subparsers.add_parser('list')
+    subparser.add_argument('-c', '--context', action='append', default=[],
+                           help="only todos with this context, can be repeated")
+    subparser.add_argument('-p', '--project', action='append', default=[],
+                           help="only todos in this project or its sub-projects, can be repeated")
+    subparser.add_argument('--priority', default='',
+                           help="only todos with one of these priorities, e.g. AB")
+    subparser.add_argument('--due-from', metavar='DATE',
+                           help="only todos due on or after DATE (YYYY-MM-DD, today or tomorrow)")
+    subparser.add_argument('--due-to', metavar='DATE',
+                           help="only todos due on or before DATE")
+    subparser.add_argument('--status', choices=['pending', 'done', 'all'], default='pending')
+    subparser.add_argument('--sort', choices=['priority', 'due', 'created', 'text'])
+    subparser.add_argument('--reverse', action='store_true', default=False)
+    subparser.add_argument('-n', '--limit', type=int)
+    subparser.add_argument('--color', choices=['auto', 'always', 'never'], default='auto')
+    subparser = subparsers.add_parser('search')
+    subparser.add_argument('search_string')
+    subparser = subparsers.add_parser('complete')
+    subparser.add_argument('line', type=int, help="line number of the todo, as shown by add and list")
+    subparser = subparsers.add_parser('daemon')
+    subparser = subparsers.add_parser('serve')
+    subparser.add_argument('--port', type=int, default=8421,
+                           help="port of the HTTP API on 127.0.0.1 (default 8421)")
 
     if len(sys.argv) == 1:
         sys.argv.append('curses')
@@ -78,6 +131,7 @@ def main():
     cfg.add_section('keys')
 
     if args.show_default_bindings:
+        from todotxt_machine.keys import KeyBindings
         d = {k: ", ".join(v['keys']) for k, v in KeyBindings({}).key_bindings.items()}
         cfg._sections['keys'] = OrderedDict(sorted(d.items(), key=lambda t: t[0]))
         cfg.write(sys.stdout)
@@ -86,12 +140,6 @@ def main():
     cfg.add_section('settings')
     cfg.read(os.path.expanduser(args.config))
 
-    # Load keybindings specified in the [keys] section of the config file
-    keyBindings = KeyBindings(dict(cfg.items('keys')))
-
-    # load the colorscheme defined in the user config, else load the default scheme
-    colorscheme = ColorScheme(dict(cfg.items('settings') ).get('colorscheme', 'default'), cfg)
-
     # Load the todo.txt file specified in the [settings] section of the config file
     # a todo.txt file on the command line takes precedence
     todotxt_file = dict(cfg.items('settings')).get('file', args.todo)
@@ -114,6 +162,124 @@ def main():
     else:
         donetxt_file_path = None
 
+    # add, list, complete and search are answered by a running daemon if
+    # there is one, see daemon.py. Without one the todo file is streamed
+    # instead of being loaded into Todos.
+    client = None
+    if args.subparser_name in ('add', 'list', 'complete', 'search') and not args.no_daemon:
+        from todotxt_machine import daemon
+        client = daemon.connect(todotxt_file_path)
+
+    def fail(error):
+        sys.stderr.write("ERROR: {0}\n".format(error))
+        exit(1)
+
+    if args.subparser_name == 'add':
+        if client is not None:
+            try:
+                print(client.request('add', item=args.body, creation_date=args.creation_date)[0])
+            except ValueError as e:
+                fail(e)
+            exit(0)
+        from todotxt_machine.todofile import append_todo
+        line_number, raw = append_todo(todotxt_file_path, args.body, add_creation_date=args.creation_date)
+        print("{0} {1}".format(line_number, raw))
+        exit(0)
+
+    if args.subparser_name == 'complete':
+        try:
+            if client is not None:
+                print(client.request('complete', line=args.line)[0])
+            else:
+                from todotxt_machine.todofile import complete_todo
+                print("{0} {1}".format(args.line, complete_todo(todotxt_file_path, args.line)))
+        except ValueError as e:
+            fail(e)
+        exit(0)
+
+    if args.subparser_name == 'search':
+        from todotxt_machine import query
+        try:
+            if client is not None:
+                lines = client.request('search', search_string=args.search_string)
+                stream_to_stdout(lambda out: out.writelines(line + '\n' for line in lines))
+            else:
+                with io.open(todotxt_file_path, encoding='utf-8') as lines:
+                    todos = query.search_todos(query.read_todos(lines), args.search_string)
+                    stream_to_stdout(lambda out: query.write_todos(out, todos))
+        except ValueError as e:
+            fail(e)
+        exit(0)
+
+    if args.subparser_name == 'daemon':
+        from todotxt_machine import daemon
+        search_index = cfg.has_option('settings', 'search_index') and cfg.getboolean('settings', 'search_index')
+        server = daemon.TodoServer(todotxt_file_path, donetxt_file_path, search_index)
+        print("serving {0} on {1}".format(todotxt_file_path, daemon.socket_path(todotxt_file_path)))
+        sys.stdout.flush()
+        signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+        try:
+            daemon.serve(server)
+        except RuntimeError as e:
+            fail(e)
+        except KeyboardInterrupt:
+            pass
+        exit(0)
+
+    if args.subparser_name == 'import':
+        from todotxt_machine import todofile
+
+        def import_from(items):
+            if args.format == 'todotxt':
+                return todofile.import_todos(todotxt_file_path, items, add_creation_date=args.creation_date)
+            from todotxt_machine import export
+            records = export.READERS[args.format](items)
+            return todofile.append_lines(todotxt_file_path, export.record_lines(records, args.creation_date))
+        try:
+            if args.file == '-':
+                count = import_from(sys.stdin)
+            else:
+                with io.open(args.file, encoding='utf-8', newline='') as items:
+                    count = import_from(items)
+        except ValueError as e:
+            sys.stderr.write("ERROR: {0}, nothing was imported\n".format(e))
+            exit(1)
+        print("imported {0} todos".format(count))
+        exit(0)
+
+    if args.subparser_name == 'export':
+        from todotxt_machine import export, query
+        with io.open(args.file or todotxt_file_path, encoding='utf-8') as lines:
+            todos = (todo for number, todo in query.read_todos(lines))
+            stream_to_stdout(lambda out: export.WRITERS[args.format](out, todos))
+        exit(0)
+
+    if args.subparser_name == 'list':
+        from todotxt_machine import query
+        try:
+            due_from = args.due_from and query.parse_date(args.due_from)
+            due_to = args.due_to and query.parse_date(args.due_to)
+        except ValueError as e:
+            parser.error(str(e))
+        escapes = None
+        if args.color == 'always' or (args.color == 'auto' and sys.stdout.isatty()):
+            from todotxt_machine.colorscheme import ColorScheme
+            escapes = query.terminal_colors(
+                ColorScheme(dict(cfg.items('settings')).get('colorscheme', 'default'), cfg).colors)
+        if client is not None:
+            lines = client.request('list', contexts=args.context, projects=args.project,
+                                   priorities=args.priority, due_from=due_from, due_to=due_to,
+                                   status=args.status, sort=args.sort, reverse=args.reverse,
+                                   limit=args.limit, escapes=escapes)
+            stream_to_stdout(lambda out: out.writelines(line + '\n' for line in lines))
+            exit(0)
+        with io.open(todotxt_file_path, encoding='utf-8') as lines:
+            todos = query.filter_todos(query.read_todos(lines), args.context, args.project,
+                                       args.priority, due_from, due_to, args.status)
+            todos = query.select(todos, args.sort, args.reverse, args.limit)
+            stream_to_stdout(lambda out: query.write_todos(out, todos, escapes))
+        exit(0)
+
     try:
         with open(todotxt_file_path, "r") as todotxt_file:
             todos = Todos(todotxt_file.readlines(), todotxt_file_path, donetxt_file_path)
@@ -121,12 +287,40 @@ def main():
         exit_with_error("ERROR: unable to open {0}\n\nEither specify one as an argument on the command line or set it in your configuration file ({0}).".format(todotxt_file_path, arguments['--config']))
         todos = Todos([], todotxt_file_path, donetxt_file_path)
 
+    if args.subparser_name == 'serve':
+        from todotxt_machine import http_api
+        if cfg.has_option('settings', 'search_index') and cfg.getboolean('settings', 'search_index'):
+            todos.enable_search_index()
+        print("serving {0} on http://{1}:{2}/todos".format(todotxt_file_path, http_api.LOOPBACK, args.port))
+        sys.stdout.flush()
+        signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
+        try:
+            http_api.serve(http_api.TodoAPI(todos), args.port)
+        except KeyboardInterrupt:
+            pass
+        exit(0)
+
     if args.subparser_name == 'curses':
-        view = UrwidUI(todos, keyBindings, colorscheme)
+        from todotxt_machine.widgets.main import UrwidUI
+        from todotxt_machine.colorscheme import ColorScheme
+        from todotxt_machine.keys import KeyBindings
+
+        # Load keybindings specified in the [keys] section of the config file
+        keyBindings = KeyBindings(dict(cfg.items('keys')))
+        if cfg.has_option('settings', 'chord_timeout'):
+            keyBindings.chord_timeout = cfg.getfloat('settings', 'chord_timeout')
+
+        # load the colorscheme defined in the user config, else load the default scheme
+        colorscheme = ColorScheme(dict(cfg.items('settings') ).get('colorscheme', 'default'), cfg)
+
+        if cfg.has_option('settings', 'search_index') and cfg.getboolean('settings', 'search_index'):
+            todos.enable_search_index()
+
+        search_timeout = 2.0
+        if cfg.has_option('settings', 'search_timeout'):
+            search_timeout = cfg.getfloat('settings', 'search_timeout')
+        view = UrwidUI(todos, keyBindings, colorscheme, search_timeout=search_timeout)
         view.main()
-    if args.subparser_name == 'add':
-        todos.create_todo(args.body, 0)
-        idx = todos.append(args.body, False)
 
     todos.save()
     # print("Writing: {0}".format(todotxt_file_path))
@@ -12,6 +12,20 @@ elif sys.version_info[0] < 3:
     import ConfigParser
     config_parser_module = ConfigParser
 
+from todotxt_machine.resources import cached_parse
+
+
+def parse_color_file(text):
+    """{section: {name: value}} of a built in color file"""
+    cfg = config_parser_module.ConfigParser()
+    if hasattr(cfg, 'read_string'):
+        cfg.read_string(text)
+    else:
+        import io
+        cfg.readfp(io.StringIO(text))
+    return dict((section, dict(cfg.items(section))) for section in cfg.sections())
+
+
 class ColorScheme:
 
     def __init__(self, name, user_config):
@@ -30,15 +44,14 @@ class ColorScheme:
             self.colors = dict( self.user_config.items(colorscheme_section) )
         else:
             # Try to load a built in theme
-            cfg = config_parser_module.ConfigParser()
             if name in os.listdir(self.built_in_colors_directory):
-                cfg.read(self.built_in_colors_directory + "/" + name)
+                sections = cached_parse(self.built_in_colors_directory + "/" + name, parse_color_file)
             # Load default theme
             else:
-                cfg.read(self.built_in_colors_directory + "/default")
+                sections = cached_parse(self.built_in_colors_directory + "/default", parse_color_file)
                 colorscheme_section = "colorscheme-default"
-            if cfg.has_section(colorscheme_section):
-                self.colors = dict( cfg.items(colorscheme_section) )
+            if colorscheme_section in sections:
+                self.colors = sections[colorscheme_section]
 
         # Split foreground and background values
         for key, value in self.colors.items():
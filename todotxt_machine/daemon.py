@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Resident process keeping a parsed todo.txt file in memory, for the daemon
+subcommand. add, list, complete and search ask it instead of reading the
+file when it is running.
+
+Requests and responses are lines on a Unix socket. A request is a command
+and a JSON object of its arguments, the response "OK <n>" followed by n
+lines, or "ERR <message>":
+
+    list {"contexts": ["@phone"], "limit": 2}
+    OK 2
+    3 (A) Call Mom @phone
+    7 Call plumber @phone
+
+Todos are identified by their line number in the file, like in the output
+of add and list. The file is stat'ed before each request and reloaded if
+something else changed it; the daemon's own writes go through todofile, so
+other programs see them right away.
+"""
+import errno
+import hashlib
+import io
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+
+try:
+    import socketserver
+except ImportError:  # Python 2
+    import SocketServer as socketserver
+
+from todotxt_machine import query, todofile
+from todotxt_machine.todo import Todos
+
+COMMANDS = ('add', 'list', 'complete', 'search')
+
+
+def socket_path(file_path):
+    """
+    Socket of the daemon serving file_path, one per todo file in
+    $XDG_RUNTIME_DIR or else in a directory of the user's in the temp
+    directory, see _private_directory
+    """
+    runtime_directory = (os.environ.get('XDG_RUNTIME_DIR') or
+                         os.path.join(tempfile.gettempdir(), 'todotxt-machine-{0}'.format(os.getuid())))
+    digest = hashlib.sha1(os.path.realpath(file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(runtime_directory, 'todotxt-machine-{0}.sock'.format(digest))
+
+
+def _private_directory(directory):
+    """
+    Create directory with mode 0700 if it is missing. Raises RuntimeError
+    unless it is a directory owned by the user that nobody else can enter,
+    so other users can neither plant a socket in it nor remove ours.
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) != 0o700:
+        raise RuntimeError('{0} must be a directory owned by you with mode 0700'.format(directory))
+
+
+class TodoServer(object):
+    """The todos of file_path and the handlers of COMMANDS"""
+
+    def __init__(self, file_path, archive_path=None, search_index=False):
+        self.file_path = file_path
+        self.archive_path = archive_path
+        self.search_index = search_index
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.todos = None
+        self.lines = {}         # line number -> Todo
+        self.line_numbers = {}  # Todo -> line number
+        self.refresh()
+
+    def refresh(self):
+        """Reload the file if it changed since it was read"""
+        stamp = todofile.file_stamp(self.file_path)
+        if stamp == self.stamp:
+            return
+        with io.open(self.file_path, encoding='utf-8') as f:
+            lines = f.readlines()
+        if self.todos is None:
+            self.todos = Todos(lines, self.file_path, self.archive_path)
+            if self.search_index:
+                self.todos.enable_search_index()
+        else:
+            self.todos.merge(lines)
+        numbers = [number for number, line in enumerate(lines, 1) if line.strip()]
+        self.lines = dict(zip(numbers, self.todos.todo_items))
+        self.line_numbers = dict(zip(self.todos.todo_items, numbers))
+        self.stamp = stamp
+
+    def handle(self, request):
+        """Response lines to one request line"""
+        command, _, arguments = request.strip().partition(' ')
+        try:
+            if command not in COMMANDS:
+                raise ValueError('unknown command: {0}'.format(command))
+            arguments = json.loads(arguments) if arguments else {}
+            with self.lock:
+                self.refresh()
+                lines = getattr(self, 'do_' + command)(**arguments)
+        except (ValueError, TypeError, KeyError, EnvironmentError) as e:
+            return ['ERR {0}'.format(e).replace('\n', ' ')]
+        return ['OK {0}'.format(len(lines))] + lines
+
+    def _numbered(self):
+        return ((self.line_numbers[todo], todo) for todo in self.todos.todo_items)
+
+    def do_add(self, item, creation_date=False):
+        if not item.strip():
+            raise ValueError('empty todo')
+        line_number, raw = todofile.append_todo(self.file_path, item, creation_date)
+        self.stamp = todofile.file_stamp(self.file_path)
+        todo = self.todos.append(raw, add_creation_date=False)
+        self.lines[line_number] = todo
+        self.line_numbers[todo] = line_number
+        return ['{0} {1}'.format(line_number, raw)]
+
+    def do_list(self, escapes=None, sort=None, reverse=False, limit=None, **filters):
+        todos = query.select(query.filter_todos(self._numbered(), **filters), sort, reverse, limit)
+        return [query.format_todo(number, todo, escapes).rstrip('\n') for number, todo in todos]
+
+    def do_complete(self, line):
+        raw = todofile.complete_todo(self.file_path, line)
+        self.stamp = todofile.file_stamp(self.file_path)
+        todo = self.lines[line]
+        if todo.raw != raw:
+            todo.update(raw)
+        return ['{0} {1}'.format(line, raw)]
+
+    def do_search(self, search_string):
+        if self.todos.valid_search(search_string) is None:
+            raise ValueError('invalid search: {0}'.format(search_string))
+        return ['{0} {1}'.format(self.line_numbers[todo], todo.raw)
+                for todo in self.todos.search(search_string)]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for request in self.rfile:
+            try:
+                request = request.decode('utf-8')
+            except UnicodeDecodeError:
+                response = ['ERR request is not UTF-8']
+            else:
+                response = self.server.todo_server.handle(request)
+            self.wfile.write(('\n'.join(response) + '\n').encode('utf-8'))
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class DaemonClient(object):
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+
+    def request(self, command, **arguments):
+        """Response lines of command, raises ValueError with the daemon's error message"""
+        self.sock.sendall('{0} {1}\n'.format(command, json.dumps(arguments)).encode('utf-8'))
+        status = self._readline()
+        if status.startswith('ERR '):
+            raise ValueError(status[4:])
+        return [self._readline() for _ in range(int(status[3:]))]
+
+    def _readline(self):
+        line = self.rfile.readline()
+        if not line.endswith(b'\n'):
+            raise IOError('todotxt-machine daemon closed the connection')
+        return line[:-1].decode('utf-8')
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def connect(file_path):
+    """DaemonClient of the daemon serving file_path, None if none is running"""
+    return _connect(socket_path(file_path))
+
+
+def _connect(path):
+    """DaemonClient of the socket at path, None if there is none or it isn't the user's"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    try:
+        if os.stat(path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return DaemonClient(sock)
+
+
+def serve(todo_server, path=None):
+    """Answer requests for todo_server on its socket until interrupted"""
+    path = path or socket_path(todo_server.file_path)
+    _private_directory(os.path.dirname(path))
+    client = _connect(path)
+    if client is not None:
+        client.close()
+        raise RuntimeError('a daemon is already serving {0}'.format(todo_server.file_path))
+    if os.path.lexists(path):
+        if os.lstat(path).st_uid != os.getuid():
+            raise RuntimeError('{0} belongs to another user'.format(path))
+        os.unlink(path)  # left behind by a daemon that was killed
+    umask = os.umask(0o077)
+    try:
+        server = _UnixServer(path, _RequestHandler)
+    finally:
+        os.umask(umask)
+    server.todo_server = todo_server
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Conversion between todo.txt lines and JSON Lines or CSV records, for the
+export and import subcommands.
+
+A record holds the fields Todos.create_todo extracts, FIELDS below. Missing
+priorities and dates are null in JSON and empty in CSV, where contexts and
+projects are space separated. from_record(to_record(todo)).build_raw() ==
+todo.build_raw(). Readers and writers work one record at a time, so files
+of any size pass through in constant memory.
+"""
+import csv
+import json
+
+from todotxt_machine.todo import Todo, _is_date
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('priority', 'creation_date', 'due_date', 'completed_date', 'contexts', 'projects', 'body')
+_DATES = ('creation_date', 'due_date', 'completed_date')
+
+
+def to_record(todo):
+    record = dict((name, getattr(todo, name) or None) for name in ('priority',) + _DATES)
+    record['contexts'] = list(todo.contexts)
+    record['projects'] = list(todo.projects)
+    record['body'] = todo.body
+    return record
+
+
+def _field(record, name):
+    """String field of record, '' if missing, raises ValueError if it isn't a string"""
+    value = record.get(name) or ''
+    if not isinstance(value, basestring):
+        raise ValueError('{0} must be a string: {1!r}'.format(name, value))
+    return value
+
+
+def from_record(record):
+    """Todo with the fields of record, raises ValueError if one is malformed"""
+    priority = _field(record, 'priority')
+    if priority and not (len(priority) == 1 and 'A' <= priority <= 'Z'):
+        raise ValueError('priority must be a letter from A to Z: {0!r}'.format(priority))
+    dates = {}
+    for name in _DATES:
+        value = _field(record, name)
+        if value and not (len(value) == 10 and _is_date(value, 0)):
+            raise ValueError('{0} must be YYYY-MM-DD: {1!r}'.format(name, value))
+        dates[name] = value
+    tags = {}
+    for name, sigil in (('contexts', '@'), ('projects', '+')):
+        values = record.get(name) or []
+        if not isinstance(values, list):
+            raise ValueError('{0} must be a list: {1!r}'.format(name, values))
+        for tag in values:
+            if not isinstance(tag, basestring) or len(tag) < 2 or tag[0] != sigil or len(tag.split()) != 1:
+                raise ValueError('{0} must look like {1}name: {2!r}'.format(name, sigil, tag))
+        tags[name] = list(values)
+    body = _field(record, 'body').replace('\r', ' ').replace('\n', ' ')
+    todo = Todo('', 0, priority=priority, body=body, **dict(dates, **tags))
+    todo.raw = todo.build_raw()
+    return todo
+
+
+def write_jsonl(out, todos):
+    for todo in todos:
+        out.write(json.dumps(to_record(todo), ensure_ascii=False, sort_keys=True) + '\n')
+
+
+def read_jsonl(lines):
+    """Records of JSON Lines, raises ValueError with the number of a line that isn't a JSON object"""
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError('line {0}: {1}'.format(number, e))
+            if not isinstance(record, dict):
+                raise ValueError('line {0}: expected a JSON object: {1}'.format(number, line.strip()))
+            yield record
+
+
+def write_csv(out, todos):
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(FIELDS)
+    for todo in todos:
+        record = to_record(todo)
+        record['contexts'] = ' '.join(record['contexts'])
+        record['projects'] = ' '.join(record['projects'])
+        writer.writerow([record[name] or '' for name in FIELDS])
+
+
+def read_csv(lines):
+    for record in csv.DictReader(lines):
+        record['contexts'] = (record.get('contexts') or '').split()
+        record['projects'] = (record.get('projects') or '').split()
+        yield record
+
+
+def record_lines(records, add_creation_date=False):
+    """todo.txt lines of records"""
+    for record in records:
+        todo = from_record(record)
+        if add_creation_date:
+            todo.add_creation_date()
+        yield todo.raw
+
+
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv}
+READERS = {'jsonl': read_jsonl, 'csv': read_csv}
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+HTTP/JSON API over a Todos, for the serve subcommand. Python 3 only, it
+runs on asyncio and listens on the loopback interface only.
+
+    GET    /todos       paged list: offset, limit, context, project,
+                        priority, status, due_from, due_to, search, sort,
+                        reverse query parameters, like the list subcommand
+    POST   /todos       {"raw": "..."} adds a todo, macros are expanded
+    GET    /todos/<id>
+    PUT    /todos/<id>  {"raw": "..."} or the fields of an export record
+    DELETE /todos/<id>
+
+Todos are exported records (see export.py) with an id, stable while the
+todo exists, and their raw text. Every response carries an ETag made from
+Todos.version (or Todo.version for a single todo), a request with a
+matching If-None-Match gets a 304 without the model being looked at, and
+PUT and DELETE honour If-Match. Requests are handled one at a time on the
+event loop, so writes are serialized. POST appends to the file with
+todofile.append_todo, PUT and DELETE save it with todofile.rewrite, both
+before the model changes, so a failed write leaves both as they were. The
+file is stat'ed before each request and reloaded if something else changed
+it.
+
+Web pages the user visits can send requests to the loopback interface too.
+Requests whose Host isn't this server's (DNS rebinding) get a 421, and POST
+and PUT need Content-Type: application/json, which a cross-origin page
+can't send without a CORS preflight, or get a 415.
+"""
+import asyncio
+import functools
+import itertools
+import json
+import logging
+import random
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from todotxt_machine import export, query, todofile
+
+LOOPBACK = '127.0.0.1'
+
+log = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message, headers=None):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class TodoAPI(object):
+    default_page_size = 100
+    max_page_size = 1000
+    max_body_size = 1 << 20
+
+    def __init__(self, todos):
+        self.todos = todos
+        self.stamp = todofile.file_stamp(todos.file_path)
+        # keeps ETags of an earlier server from matching
+        self.token = '%08x' % random.getrandbits(32)
+        self.ids = {}       # Todo -> id
+        self.by_id = {}     # id -> Todo
+        self.next_id = 1
+
+    def refresh(self):
+        """Reload the file if something else changed it, keeping the ids of surviving todos"""
+        stamp = todofile.file_stamp(self.todos.file_path)
+        if stamp == self.stamp:
+            return
+        self.todos.reload_from_file()
+        self.stamp = stamp
+        alive = set(self.todos.todo_items)
+        for todo in [todo for todo in self.ids if todo not in alive]:
+            del self.by_id[self.ids.pop(todo)]
+
+    def save(self, lines):
+        """Replace the file with lines, the raw texts the todos are about to have"""
+        todofile.rewrite(self.todos.file_path, lines)
+        self.stamp = todofile.file_stamp(self.todos.file_path)
+
+    def etag(self, todo=None):
+        if todo is None:
+            return '"{0}-{1}"'.format(self.token, self.todos.version)
+        return '"{0}-{1}-{2}"'.format(self.token, self.id(todo), todo.version)
+
+    def id(self, todo):
+        todo_id = self.ids.get(todo)
+        if todo_id is None:
+            todo_id = self.ids[todo] = self.next_id
+            self.by_id[todo_id] = todo
+            self.next_id += 1
+        return todo_id
+
+    def record(self, todo):
+        record = export.to_record(todo)
+        record['id'] = self.id(todo)
+        record['raw'] = todo.raw
+        return record
+
+    def handle(self, method, target, headers, body):
+        """(status, headers, JSON payload or None) of a request"""
+        try:
+            self.refresh()
+            url = urlsplit(target)
+            path = url.path.rstrip('/').split('/')[1:]
+            if method in ('POST', 'PUT') and \
+                    headers.get('content-type', '').partition(';')[0].strip().lower() != 'application/json':
+                raise HTTPError(415, 'Content-Type must be application/json')
+            if path == ['todos']:
+                if method in ('GET', 'HEAD'):
+                    return self.list_todos(headers, parse_qs(url.query))
+                if method == 'POST':
+                    return self.create_todo(_json(body))
+                raise HTTPError(405, 'method not allowed', {'Allow': 'GET, HEAD, POST'})
+            if len(path) == 2 and path[0] == 'todos':
+                todo_id = path[1]
+                todo = self.by_id.get(int(todo_id)) if todo_id.isascii() and todo_id.isdigit() else None
+                if todo is None:
+                    raise HTTPError(404, 'no todo {0}'.format(path[1]))
+                if method in ('GET', 'HEAD'):
+                    return self.get_todo(headers, todo)
+                if method in ('PUT', 'DELETE'):
+                    if headers.get('if-match', '*') not in ('*', self.etag(todo)):
+                        raise HTTPError(412, 'todo {0} has changed'.format(path[1]))
+                    if method == 'PUT':
+                        return self.update_todo(todo, _json(body))
+                    return self.delete_todo(todo)
+                raise HTTPError(405, 'method not allowed', {'Allow': 'GET, HEAD, PUT, DELETE'})
+            raise HTTPError(404, 'not found')
+        except HTTPError as e:
+            return e.status, e.headers, {'error': str(e)}
+        except Exception as e:
+            log.exception('%s %s failed', method, target)
+            return 500, {}, {'error': 'internal error: {0}'.format(e)}
+
+    def list_todos(self, headers, params):
+        etag = self.etag()
+        if headers.get('if-none-match') == etag:
+            return 304, {'ETag': etag}, None
+
+        def param(name, default=None):
+            return params.get(name, [default])[-1]
+        try:
+            offset = max(0, int(param('offset', 0)))
+            limit = min(self.max_page_size, max(0, int(param('limit', self.default_page_size))))
+            due_from = param('due_from') and query.parse_date(param('due_from'))
+            due_to = param('due_to') and query.parse_date(param('due_to'))
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        status = param('status', 'pending')
+        sort = param('sort')
+        if status not in query.STATUSES or (sort is not None and sort not in query.SORT_KEYS):
+            raise HTTPError(400, 'status must be one of {0} and sort one of {1}'.format(
+                ', '.join(query.STATUSES), ', '.join(sorted(query.SORT_KEYS))))
+
+        todos = self.todos.todo_items
+        search = param('search')
+        if search:
+            if self.todos.valid_search(search) is None:
+                raise HTTPError(400, 'invalid search: {0}'.format(search))
+            todos = self.todos.search(search)
+        matches = list(query.filter_todos(((None, todo) for todo in todos), params.get('context', []),
+                                          params.get('project', []), param('priority', ''),
+                                          due_from, due_to, status))
+        total = len(matches)
+        if sort is not None:
+            matches = query.select(matches, sort, param('reverse') in ('1', 'true'))
+        page = [self.record(todo) for _, todo in itertools.islice(matches, offset, offset + limit)]
+        return 200, {'ETag': etag}, {'total': total, 'offset': offset, 'limit': limit, 'todos': page}
+
+    def get_todo(self, headers, todo):
+        etag = self.etag(todo)
+        if headers.get('if-none-match') == etag:
+            return 304, {'ETag': etag}, None
+        return 200, {'ETag': etag}, self.record(todo)
+
+    def create_todo(self, data):
+        _, raw = todofile.append_todo(self.todos.file_path, _raw(data), bool(data.get('creation_date')))
+        self.stamp = todofile.file_stamp(self.todos.file_path)
+        todo = self.todos.append(raw, add_creation_date=False)
+        return 201, {'ETag': self.etag(todo), 'Location': '/todos/{0}'.format(self.id(todo))}, self.record(todo)
+
+    def update_todo(self, todo, data):
+        raw = todofile.normalize(_raw(data))
+        self.save(raw if other is todo else other.raw for other in self.todos.todo_items)
+        todo.update(raw)
+        return 200, {'ETag': self.etag(todo)}, self.record(todo)
+
+    def delete_todo(self, todo):
+        self.save(other.raw for other in self.todos.todo_items if other is not todo)
+        self.todos.delete(todo)
+        del self.by_id[self.ids.pop(todo)]
+        return 204, {}, None
+
+
+def _json(body):
+    try:
+        data = json.loads(body.decode('utf-8'))
+    except ValueError:
+        raise HTTPError(400, 'body must be a JSON object')
+    if not isinstance(data, dict):
+        raise HTTPError(400, 'body must be a JSON object')
+    return data
+
+
+def _raw(data):
+    """todo.txt text of a request body, {"raw": ...} or an export record"""
+    try:
+        raw = data['raw'] if 'raw' in data else export.from_record(data).raw
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    if not isinstance(raw, str) or not raw.strip():
+        raise HTTPError(400, 'empty todo')
+    return raw.replace('\r', ' ').replace('\n', ' ')
+
+
+def _response(status, headers, payload, keep_alive, head=False):
+    body = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    lines = ['HTTP/1.1 {0} {1}'.format(status, HTTPStatus(status).phrase)]
+    if body:
+        lines.append('Content-Type: application/json; charset=utf-8')
+    if status not in (204, 304):
+        lines.append('Content-Length: {0}'.format(len(body)))
+    if not keep_alive:
+        lines.append('Connection: close')
+    lines.extend('{0}: {1}'.format(name, value) for name, value in headers.items())
+    head_bytes = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    return head_bytes if head or status in (204, 304) else head_bytes + body
+
+
+async def _serve_connection(api, reader, writer):
+    port = writer.get_extra_info('sockname')[1]
+    hosts = ('{0}:{1}'.format(LOOPBACK, port), 'localhost:{0}'.format(port))
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+                length = int(headers.get('content-length') or 0)
+            except ValueError:
+                writer.write(_response(400, {}, {'error': 'bad request'}, False))
+                break
+            if headers.get('host', '').lower() not in hosts:
+                writer.write(_response(421, {}, {'error': 'Host must be one of {0}'.format(', '.join(hosts))}, False))
+                break
+            if length > api.max_body_size:
+                writer.write(_response(413, {}, {'error': 'body too large'}, False))
+                break
+            body = await reader.readexactly(length) if length else b''
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            status, response_headers, payload = api.handle(method, target, headers, body)
+            writer.write(_response(status, response_headers, payload, keep_alive, method == 'HEAD'))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_server(api, port):
+    """asyncio server answering requests for api on LOOPBACK:port"""
+    return asyncio.start_server(functools.partial(_serve_connection, api), LOOPBACK, port)
+
+
+def serve(api, port):
+    """Answer requests for api until interrupted"""
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(start_server(api, port))
+    try:
+        loop.run_forever()
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
@@ -1,32 +1,82 @@
-import yaml
-from pkg_resources import resource_stream
+from todotxt_machine.resources import resource_path, cached_parse
+
+try:
+    basestring
+except NameError:
+    basestring = str
+
+# Separates the keys of a chord binding, e.g. 'd>d' or 'g>g'
+CHORD_SEPARATOR = '>'
+# Returned by get_chord_handler while a chord is being typed
+CHORD_PENDING = 'chord pending'
+# Trie node entry holding the handler of the chord that ends there
+_CHORD_END = None
+
+
+def _parse_yaml(text):
+    import yaml
+    return yaml.safe_load(text)
+
+
+def split_chord(key):
+    """Keys of a chord binding, or None for a single key"""
+    if CHORD_SEPARATOR not in key or key == CHORD_SEPARATOR:
+        return None
+    return key.split(CHORD_SEPARATOR)
 
 
 class KeyBindings:
     user_keys = []
+    # seconds to wait for the next key of a chord
+    chord_timeout = 1.0
 
     def __init__(self, user_keys):
         self.user_keys = user_keys
         self.key_bindings = {}
+        self._pending = None
+        self._alarm = None
+        self._set_alarm_in = None
+        self._remove_alarm = None
+        # urwid command maps shared by the Vi widgets, see widgets.vi
+        self.command_maps = {}
         self.fill_with_defaults()
         self.fill_with_user_keys(user_keys)
+        self.build_handlers()
 
     def fill_with_user_keys(self, users_keys):
         for bind in users_keys:
             key = self.user_keys_to_list(users_keys[bind])
             try:
-                self.key_bindings[bind] = key
+                self.key_bindings[bind]['keys'] = key
             except KeyError:
                 print("KeyBind \""+bind+"\" not found")
 
     def fill_with_defaults(self):
-        with resource_stream(__package__, 'default_keys.yaml') as f:
-            config = yaml.load(f)
-        for name, data in config['key_bindings'].iteritems():
+        config = cached_parse(resource_path('default_keys.yaml'), _parse_yaml)
+        for name, data in config['key_bindings'].items():
             if isinstance(data['keys'], basestring):
                 data['keys'] = [data['keys']]
             self.key_bindings[name] = data
 
+    def build_handlers(self):
+        # (context, key) -> (callback, kwargs), looked up on every keypress
+        self.handlers = {}
+        # context -> trie of chord keys, nested dicts ending in _CHORD_END
+        self.chords = {}
+        for name, data in self.key_bindings.items():
+            if not data.get('callback'):
+                continue  # only listed in the help panel
+            handler = data['callback'], data.get('kwargs', {})
+            for key in data['keys']:
+                chord = split_chord(key)
+                if chord is None:
+                    self.handlers.setdefault((data['handler'], key), handler)
+                    continue
+                node = self.chords.setdefault(data['handler'], {})
+                for chord_key in chord:
+                    node = node.setdefault(chord_key, {})
+                node.setdefault(_CHORD_END, handler)
+
     def __getitem__(self, index):
         return ", ".join(self.get_key_binding(index))
 
@@ -47,8 +97,69 @@ class KeyBindings:
         return key in self.get_key_binding(bind)
 
     def get_handler(self, key, context):
-        # TODO create data structure to optimize this...
-        for name, data in self.key_bindings.iteritems():
-            if key in data['keys'] and data['handler'] == context:
-                return data['callback'], data.get('kwargs', {})
-        return None, {}
+        return self.handlers.get((context, key), (None, {}))
+
+    def use_alarms(self, set_alarm_in, remove_alarm):
+        """Time out pending chords with the main loop's set_alarm_in/remove_alarm"""
+        self._set_alarm_in = set_alarm_in
+        self._remove_alarm = remove_alarm
+
+    def filter_input(self, keys, raw=None):
+        """
+        MainLoop input_filter cancelling a pending chord on any key that
+        doesn't continue it, before widgets get to see the key: the listbox
+        command map would otherwise swallow keys like 'j' and leave the
+        chord pending until it times out.
+        """
+        for key in keys:
+            if self._pending is not None and key not in self._pending[0]:
+                self.cancel_chord(run_fallback=True)
+        return keys
+
+    def get_chord_handler(self, widget, key, context):
+        """
+        Feed key to the chord tries. Returns the handler of a completed
+        chord, (CHORD_PENDING, {}) while more keys are expected, or
+        (None, {}) when key isn't part of a chord in context.
+
+        A chord pending in another context is left alone, keys pass through
+        the todo context before they reach the listbox. A key that doesn't
+        continue the chord cancels it, running the binding of the keys typed
+        so far if there is one.
+        """
+        if self._pending is not None and self._pending[1] == context:
+            node = self._pending[0].get(key)
+            self.cancel_chord(run_fallback=node is None)
+            if node is not None:
+                return self._enter_chord(node, widget, context, None)
+        root = self.chords.get(context)
+        if root is None:
+            return None, {}
+        node = root.get(key)
+        if node is None:
+            return None, {}
+        return self._enter_chord(node, widget, context, self.handlers.get((context, key)))
+
+    def _enter_chord(self, node, widget, context, fallback):
+        if len(node) == 1 and _CHORD_END in node:
+            return node[_CHORD_END]
+        self._pending = (node, context, widget, node.get(_CHORD_END, fallback))
+        if self._set_alarm_in is not None:
+            self._alarm = self._set_alarm_in(self.chord_timeout, self._chord_timed_out)
+        return CHORD_PENDING, {}
+
+    def _chord_timed_out(self, loop=None, user_data=None):
+        self._alarm = None
+        self.cancel_chord(run_fallback=True)
+
+    def cancel_chord(self, run_fallback=False):
+        if self._pending is None:
+            return
+        node, context, widget, fallback = self._pending
+        self._pending = None
+        if self._alarm is not None:
+            self._remove_alarm(self._alarm)
+            self._alarm = None
+        if run_fallback and fallback is not None:
+            callback, kwargs = fallback
+            getattr(widget, callback)(**kwargs)
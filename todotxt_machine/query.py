@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Non-interactive listing of a todo.txt file, for the list and search
+subcommands.
+
+Each stage is a generator over (line number, Todo) pairs: todos are parsed
+as the file is read and written out as soon as they pass the filters, so
+`todotxt-machine list | head` returns right away and memory stays flat on
+huge files. Only sorting has to see every todo, and with a limit it keeps
+just the best limit of them in a heap.
+"""
+import heapq
+import itertools
+import re
+from datetime import date, timedelta
+
+from todotxt_machine.cache import patterns
+from todotxt_machine.todo import Todos
+from todotxt_machine.terminal_operations import TerminalOperations
+
+STATUSES = ('pending', 'done', 'all')
+
+# Todos without the field sort last
+SORT_KEYS = {
+    'priority': lambda todo: (not todo.priority, todo.priority),
+    'due':      lambda todo: (not todo.due_date, todo.due_date),
+    'created':  lambda todo: (not todo.creation_date, todo.creation_date),
+    'text':     lambda todo: todo.raw,
+}
+
+_date_regex = re.compile(r'^\d\d\d\d-\d\d-\d\d$')
+
+
+def parse_date(text):
+    """YYYY-MM-DD string of a date argument, today and tomorrow are allowed"""
+    if text == 'today':
+        return str(date.today())
+    if text == 'tomorrow':
+        return str(date.today() + timedelta(days=1))
+    if not _date_regex.match(text):
+        raise ValueError('expected YYYY-MM-DD, today or tomorrow: {0}'.format(text))
+    return text
+
+
+def read_todos(lines):
+    """(line number, Todo) of every non blank line"""
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            yield number, Todos.create_todo(line, number - 1)
+
+
+def filter_todos(todos, contexts=(), projects=(), priorities='', due_from=None, due_to=None, status='pending'):
+    """
+    The todos with any of contexts, a project starting with any of projects
+    (so +work also matches +work.infra), a priority in priorities and a due
+    date between due_from and due_to inclusive. Empty filters match all.
+    """
+    contexts = [c if c.startswith('@') else '@' + c for c in contexts]
+    projects = [p if p.startswith('+') else '+' + p for p in projects]
+    for number, todo in todos:
+        if status != 'all' and todo.is_complete() != (status == 'done'):
+            continue
+        if contexts and not any(c in todo.contexts for c in contexts):
+            continue
+        if projects and not any(p.startswith(prefix) for p in todo.projects for prefix in projects):
+            continue
+        if priorities and not (todo.priority and todo.priority in priorities):
+            continue
+        if due_from or due_to:
+            due_date = todo.due_date
+            if not due_date or (due_from and due_date < due_from) or (due_to and due_date > due_to):
+                continue
+        yield number, todo
+
+
+def search_todos(todos, search_string):
+    """
+    The todos matching search_string case insensitively, like the curses
+    search. Raises ValueError if it is not a valid regex.
+    """
+    reg = patterns.compile('(%s)' % search_string, re.IGNORECASE)
+    if reg is None:
+        raise ValueError('invalid search: {0}'.format(search_string))
+    for number, todo in todos:
+        if reg.search(todo.raw):
+            yield number, todo
+
+
+def select(todos, sort=None, reverse=False, limit=None):
+    """todos sorted by one of SORT_KEYS and cut to limit"""
+    if sort is None:
+        return todos if limit is None else itertools.islice(todos, limit)
+    todo_key = SORT_KEYS[sort]
+
+    def key(item):
+        return todo_key(item[1])
+    if limit is None:
+        return iter(sorted(todos, key=key, reverse=reverse))
+    return iter((heapq.nlargest if reverse else heapq.nsmallest)(limit, todos, key=key))
+
+
+def terminal_colors(colors):
+    """ANSI escapes for the h<index> foreground colors of a ColorScheme"""
+    escapes = {}
+    for name, color in colors.items():
+        match = re.match(r'^h(\d+)$', color['fg'])
+        if match:
+            escapes[name] = TerminalOperations.foreground_color(int(match.group(1)))
+    return escapes
+
+
+def _runs(markup, attr=None):
+    if isinstance(markup, tuple):
+        for run in _runs(markup[1], markup[0]):
+            yield run
+    elif isinstance(markup, list):
+        for part in markup:
+            for run in _runs(part, attr):
+                yield run
+    elif markup:
+        yield attr, markup
+
+
+def format_todo(number, todo, escapes=None):
+    """'<line number> <todo>' line, colored like the curses UI if escapes are given"""
+    if escapes is None:
+        text = todo.raw
+    else:
+        clear = TerminalOperations.clear_formatting()
+        text = ''.join(clear + escapes.get(attr, '') + run for attr, run in _runs(todo.build_markup(todo.raw)))
+        text += clear
+    return u'{0} {1}\n'.format(number, text)
+
+
+def write_todos(out, todos, escapes=None):
+    for number, todo in todos:
+        out.write(format_todo(number, todo, escapes))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Package data files and a cache of their parsed form.
+
+Parsing default_keys.yaml means importing PyYAML, and reading a color file
+means running configparser, on every start. cached_parse keeps the parsed
+result in a marshal file under the user's cache directory, rebuilt whenever
+the source file's mtime or size changes.
+"""
+import io
+import marshal
+import os
+import sys
+
+_cache_version = 1
+
+
+def resource_path(name):
+    """Filesystem path of a file shipped in the todotxt_machine package"""
+    try:
+        from importlib.resources import files
+    except ImportError:
+        from pkg_resources import resource_filename
+        return resource_filename(__package__, name)
+    return str(files(__package__).joinpath(name))
+
+
+def cache_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'todotxt-machine')
+
+
+def cached_parse(path, parse, cache_dir=None):
+    """
+    parse(text) of the file at path. The result has to be marshallable
+    (dicts, lists, strings, numbers, None).
+    """
+    stat = os.stat(path)
+    stamp = (_cache_version, sys.version_info[:2], os.path.abspath(path), stat.st_mtime, stat.st_size)
+    cache_file = os.path.join(cache_dir or cache_directory(),
+                              os.path.basename(path) + '.{0}{1}.marshal'.format(*sys.version_info[:2]))
+    try:
+        with open(cache_file, 'rb') as f:
+            cached_stamp, data = marshal.load(f)
+        if tuple(cached_stamp) == stamp:
+            return data
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        pass
+
+    with io.open(path, encoding='utf-8') as f:
+        data = parse(f.read())
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        temp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+        with open(temp_file, 'wb') as f:
+            marshal.dump((stamp, data), f)
+        os.rename(temp_file, cache_file)
+    except (IOError, OSError):
+        pass  # read only home, just parse again next time
+    return data
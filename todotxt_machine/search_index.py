@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+# Characters that give a search string regex meaning, '.' is handled apart
+_special_characters = frozenset('^$*+?{}[]\\|()')
+
+
+def _is_ascii(text):
+    try:
+        text.encode('ascii')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return False
+    return True
+
+
+def is_literal(search_string):
+    """True if search_string has no regex meaning and matches itself"""
+    return '.' not in search_string and not _special_characters.intersection(search_string)
+
+
+def trigrams(text):
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+class TrigramIndex(object):
+    """
+    Case insensitive trigram index over Todo.raw, used to narrow the todos a
+    search regex has to be run against.
+
+    Only ASCII lines are indexed: re.IGNORECASE folds a few non-ASCII
+    characters onto ASCII letters (the Kelvin sign matches 'k'), so any
+    other line is always returned as a candidate.
+    """
+
+    def __init__(self, todos=()):
+        self._postings = {}
+        self._unindexed = set()
+        for todo in todos:
+            self.add(todo)
+
+    def add(self, todo):
+        text = todo.raw
+        if not _is_ascii(text):
+            self._unindexed.add(todo)
+            return
+        for gram in trigrams(text.lower()):
+            todos = self._postings.get(gram)
+            if todos is None:
+                todos = self._postings[gram] = set()
+            todos.add(todo)
+
+    def remove(self, todo):
+        text = todo.raw
+        if not _is_ascii(text):
+            self._unindexed.discard(todo)
+            return
+        for gram in trigrams(text.lower()):
+            todos = self._postings.get(gram)
+            if todos is not None:
+                todos.discard(todo)
+                if not todos:
+                    del self._postings[gram]
+
+    @staticmethod
+    def literals(search_string):
+        """
+        Lowercased runs of text a match must contain, or None if the search
+        string cannot be decomposed. Only plain text and '.' wildcards are
+        understood, anything else falls back to a full scan.
+        """
+        if len(search_string) < 3 or not _is_ascii(search_string):
+            return None
+        if _special_characters.intersection(search_string):
+            return None
+        runs = [run for run in search_string.lower().split('.') if len(run) >= 3]
+        return runs or None
+
+    def candidates(self, search_string):
+        """
+        Set of todos that may match search_string, a superset of the real
+        matches. None means the search string can't be narrowed and every
+        todo has to be scanned.
+        """
+        literals = self.literals(search_string)
+        if literals is None:
+            return None
+        postings = []
+        for gram in set().union(*[trigrams(literal) for literal in literals]):
+            todos = self._postings.get(gram)
+            if not todos:
+                return set(self._unindexed)
+            postings.append(todos)
+        postings.sort(key=len)
+        found = postings[0].intersection(*postings[1:])
+        found.update(self._unindexed)
+        return found
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding=utf-8
+import errno
+import json
+import os
+import signal
+
+
+class SearchWorker(object):
+    """
+    Runs a todo search in a forked child process so a slow or runaway regex
+    can't block the urwid main loop.
+
+    The re module holds the GIL while matching and can't be interrupted, so
+    a thread would neither keep the UI responsive nor be cancellable. The
+    child streams "index<TAB>json groups" lines back over a pipe that the
+    main loop watches (watch_file/remove_watch_file), a new search kills the
+    one in flight, and the child is killed by SIGALRM once time_budget
+    seconds have passed.
+
+    on_results(todos) is called with each batch of matches as it arrives,
+    on_done(complete) once the search finished (True) or was aborted by the
+    time budget (False). Cancelled searches report nothing.
+    """
+    batch_size = 200
+
+    def __init__(self, todos, watch_file, remove_watch_file, on_results, on_done, time_budget=2.0):
+        self.todos = todos
+        self.watch_file = watch_file
+        self.remove_watch_file = remove_watch_file
+        self.on_results = on_results
+        self.on_done = on_done
+        self.time_budget = time_budget
+        self.pid = None
+        self._fd = None
+        self._handle = None
+        self._items = None
+        self._buffer = b''
+        self._complete = False
+
+    def running(self):
+        return self.pid is not None
+
+    def start(self, search_string, invert=False):
+        """Search in a new child process, raises ValueError if search_string isn't a valid regex"""
+        self.cancel()
+        reg = self.todos.valid_search(search_string)
+        if reg is None:
+            raise ValueError('invalid search: {0}'.format(search_string))
+        items = list(self.todos.todo_items)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                self._run_child(write_fd, reg, items, invert)
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        self.pid = pid
+        self._fd = read_fd
+        self._items = items
+        self._buffer = b''
+        self._complete = False
+        self._handle = self.watch_file(read_fd, self._readable)
+
+    def cancel(self):
+        if self.pid is None:
+            return
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+        self._cleanup()
+
+    def _run_child(self, write_fd, reg, items, invert):
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        if self.time_budget:
+            signal.setitimer(signal.ITIMER_REAL, self.time_budget)
+        lines = []
+        for index, t in enumerate(items):
+            match = reg.search(t.raw)
+            if invert:
+                if match:
+                    continue
+                groups = None
+            elif not match:
+                continue
+            else:
+                groups = match.groups()
+            lines.append(u'{0}\t{1}\n'.format(index, json.dumps(groups)))
+            if len(lines) >= self.batch_size:
+                self._write(write_fd, lines)
+                lines = []
+        lines.append(u'DONE\n')
+        self._write(write_fd, lines)
+        os.close(write_fd)
+
+    @staticmethod
+    def _write(fd, lines):
+        data = u''.join(lines).encode('utf-8')
+        while data:
+            data = data[os.write(fd, data):]
+
+    def _readable(self):
+        data = os.read(self._fd, 65536)
+        if not data:
+            complete = self._complete
+            self._cleanup()
+            self.on_done(complete)
+            return
+        lines = (self._buffer + data).split(b'\n')
+        self._buffer = lines.pop()
+        batch = []
+        for line in lines:
+            if line == b'DONE':
+                self._complete = True
+                continue
+            index, groups = line.split(b'\t', 1)
+            todo = self._items[int(index)]
+            groups = json.loads(groups.decode('utf-8'))
+            if groups is not None:
+                todo.search_matches = tuple(groups)
+            batch.append(todo)
+        if batch:
+            self.on_results(batch)
+
+    def _cleanup(self):
+        self.remove_watch_file(self._handle)
+        os.close(self._fd)
+        os.waitpid(self.pid, 0)
+        self.pid = None
+        self._fd = None
+        self._handle = None
+        self._items = None
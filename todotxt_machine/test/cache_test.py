@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding=utf-8
+import logging
+import pytest
+import re
+import urwid
+from .. import cache
+from ..widgets.main import UrwidUI
+
+
+def test_lru_cache_evicts_least_recently_used():
+    lru = cache.LRUCache(maxsize=2)
+    lru["a"] = 1
+    lru["b"] = 2
+    assert lru.get("a") == 1
+    lru["c"] = 3
+    assert "b" not in lru
+    assert lru.get("b") is None
+    assert len(lru) == 2
+    assert lru.stats() == {
+        'size': 2, 'maxsize': 2, 'hits': 1, 'misses': 1, 'evictions': 1, 'hit_rate': 0.5}
+
+
+def test_pattern_cache():
+    patterns = cache.PatternCache(maxsize=4)
+    compiled = patterns.compile("(the)", re.IGNORECASE)
+    assert compiled.search("THE end").group(1) == "THE"
+    assert patterns.compile("(the)", re.IGNORECASE) is compiled
+    assert patterns.compile("(the)") is not compiled
+    assert patterns.compile("{b}[") is None
+    assert patterns.compile("{b}[") is None
+    assert (patterns.hits, patterns.misses) == (2, 3)
+
+
+def test_ui_logs_cache_stats_on_quit(caplog):
+    class UI(object):
+        search_worker = None
+        row_cache = cache.LRUCache(maxsize=4)
+    with caplog.at_level(logging.INFO), pytest.raises(urwid.ExitMainLoop):
+        UrwidUI.quit(UI())
+    assert "row cache: {" in caplog.text and "'maxsize': 4" in caplog.text
+    assert "search pattern cache: {" in caplog.text
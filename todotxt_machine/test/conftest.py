@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+# coding=utf-8
+import pytest
+from .. import todofile
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmpdir_factory, monkeypatch):
+    """Caches written by the code under test go to a temporary directory, not ~/.cache"""
+    cache_home = tmpdir_factory.mktemp('cache')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_home))
+    monkeypatch.setattr(todofile, '_line_counts', {})
+    return cache_home
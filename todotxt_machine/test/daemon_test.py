@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding=utf-8
+import os
+import pytest
+import threading
+from datetime import date
+from .. import daemon
+
+
+@pytest.fixture
+def path(tmpdir):
+    path = tmpdir.join('todo.txt')
+    path.write('(A) Call Mom @phone\n\nx 2015-01-05 done thing +work\nfix server +work @office\n')
+    return path
+
+
+@pytest.fixture
+def server(path):
+    return daemon.TodoServer(str(path))
+
+
+def test_commands(path, server):
+    assert server.handle('list {}') == ['OK 2', '1 (A) Call Mom @phone', '4 fix server +work @office']
+    assert server.handle('list {"projects": ["work"], "status": "all"}') == [
+        'OK 2', '3 x 2015-01-05 done thing +work', '4 fix server +work @office']
+    assert server.handle('add {"item": "@phone call bob"}') == ['OK 1', '5 call bob @phone']
+    assert server.handle('search {"search_string": "CALL"}') == ['OK 2', '1 (A) Call Mom @phone', '5 call bob @phone']
+    assert server.handle('complete {"line": 4}') == ['OK 1', '4 x %s fix server +work @office' % date.today()]
+    assert server.handle('list {"contexts": ["@office"], "status": "done"}')[1:] == [
+        '4 x %s fix server +work @office' % date.today()]
+    assert path.read().splitlines()[3:] == ['x %s fix server +work @office' % date.today(), 'call bob @phone']
+
+
+def test_errors(server):
+    assert server.handle('complete {"line": 2}') == ['ERR no todo on line 2']
+    assert server.handle('search {"search_string": "("}') == ['ERR invalid search: (']
+    assert server.handle('delete {}')[0].startswith('ERR unknown command')
+    assert server.handle('list {"bogus": 1}')[0].startswith('ERR ')
+    assert server.handle('list not json')[0].startswith('ERR ')
+
+
+def test_reloads_changed_file(path, server):
+    server.handle('list {}')
+    path.write('(B) replaced\n')
+    assert server.handle('list {}') == ['OK 1', '1 (B) replaced']
+
+
+def test_socket(server, tmpdir, monkeypatch):
+    socket_path = str(tmpdir.join('daemon.sock'))
+    unix_server = daemon._UnixServer(socket_path, daemon._RequestHandler)
+    unix_server.todo_server = server
+    thread = threading.Thread(target=unix_server.serve_forever)
+    thread.start()
+    try:
+        client = daemon._connect(socket_path)
+        assert client.request('list', contexts=['@phone']) == ['1 (A) Call Mom @phone']
+        assert client.request('add', item='second request') == ['5 second request']
+        try:
+            client.request('complete', line=2)
+            assert False
+        except ValueError as e:
+            assert str(e) == 'no todo on line 2'
+        client.sock.sendall(b'list {"contexts": ["@\xff"]}\n')
+        assert client._readline() == 'ERR request is not UTF-8'
+        assert client.request('list', limit=1) == ['1 (A) Call Mom @phone']
+        client.close()
+        # someone else's socket is never connected to
+        uid = os.getuid()
+        monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+        assert daemon._connect(socket_path) is None
+    finally:
+        unix_server.shutdown()
+        unix_server.server_close()
+        thread.join()
+    assert daemon._connect(str(tmpdir.join('missing.sock'))) is None
+
+
+def test_socket_directory(tmpdir, monkeypatch):
+    monkeypatch.delenv('XDG_RUNTIME_DIR', raising=False)
+    monkeypatch.setattr(daemon.tempfile, 'tempdir', str(tmpdir))
+    directory = str(tmpdir.join('todotxt-machine-{0}'.format(os.getuid())))
+    assert os.path.dirname(daemon.socket_path('todo.txt')) == directory
+    daemon._private_directory(directory)
+    assert os.stat(directory).st_mode & 0o777 == 0o700
+    daemon._private_directory(directory)
+
+    os.chmod(directory, 0o755)
+    with pytest.raises(RuntimeError):
+        daemon._private_directory(directory)
+    os.chmod(directory, 0o700)
+    uid = os.getuid()
+    monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+    with pytest.raises(RuntimeError):
+        daemon._private_directory(directory)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# coding=utf-8
+import io
+import pytest
+from .. import export, query
+
+LINES = [
+    'x 2015-01-05 2015-01-01 (A) done thing due:2015-01-04 +work @desk\n',
+    '(C) fix  server, twice +work.infra @office @home due:2015-02-01\n',
+    'plain "quoted, text"\n',
+    '2015-03-04 ünïcode +proj\n',
+]
+
+
+def todos():
+    return [todo for number, todo in query.read_todos(LINES)]
+
+
+@pytest.mark.parametrize('format', export.FORMATS)
+def test_round_trip(format):
+    out = io.StringIO()
+    export.WRITERS[format](out, todos())
+    out.seek(0)
+    imported = [export.from_record(record) for record in export.READERS[format](out)]
+    assert [todo.build_raw() for todo in imported] == [todo.build_raw() for todo in todos()]
+    assert [todo.raw for todo in imported] == [todo.build_raw() for todo in todos()]
+
+
+def test_record():
+    record = export.to_record(todos()[1])
+    assert record == {'priority': 'C', 'creation_date': None, 'due_date': '2015-02-01', 'completed_date': None,
+                      'contexts': ['@home', '@office'], 'projects': ['+work.infra'], 'body': 'fix  server, twice'}
+
+
+def test_from_record_validates():
+    assert export.from_record({'body': 'a\nb', 'contexts': ['@x']}).raw == 'a b @x'
+    for record in ({'priority': 'a'}, {'due_date': '2015-1-2'}, {'contexts': ['x']}, {'projects': ['+a b']},
+                   {'priority': 1}, {'due_date': 5}, {'body': ['a']}, {'contexts': '@x'}, {'projects': [3]}):
+        with pytest.raises(ValueError):
+            export.from_record(record)
+
+
+def test_read_jsonl_rejects_non_objects():
+    lines = ['{"body": "a"}\n', '\n', '["b"]\n']
+    records = export.read_jsonl(lines)
+    assert next(records) == {'body': 'a'}
+    with pytest.raises(ValueError) as e:
+        next(records)
+    assert str(e.value).startswith('line 3:')
+    with pytest.raises(ValueError) as e:
+        list(export.read_jsonl(['{"body": "a"}\n', '{oops\n']))
+    assert str(e.value).startswith('line 2:')
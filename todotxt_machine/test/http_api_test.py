@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# coding=utf-8
+import asyncio
+import json
+import pytest
+from datetime import date
+from ..todo import Todos
+from .. import http_api
+
+
+@pytest.fixture
+def path(tmpdir):
+    path = tmpdir.join('todo.txt')
+    path.write('(A) Call Mom @phone\nx 2015-01-05 done thing +work\n(C) fix server +work @office\n(B) report +work\n')
+    return path
+
+
+@pytest.fixture
+def api(path):
+    with open(str(path)) as f:
+        todos = Todos(f.readlines(), str(path), None)
+    return http_api.TodoAPI(todos)
+
+
+def request(api, method, target, body=None, **headers):
+    if body is not None:
+        headers.setdefault('content_type', 'application/json')
+    headers = dict((name.replace('_', '-').lower(), value) for name, value in headers.items())
+    status, response_headers, payload = api.handle(
+        method, target, headers, json.dumps(body).encode('utf-8') if body is not None else b'')
+    return status, response_headers, payload
+
+
+def test_list_paging_and_filters(api):
+    status, headers, payload = request(api, 'GET', '/todos?limit=2&offset=1')
+    assert status == 200 and payload['total'] == 3
+    assert [todo['raw'] for todo in payload['todos']] == ['(C) fix server +work @office', '(B) report +work']
+    status, headers, payload = request(api, 'GET', '/todos?project=work&sort=priority&reverse=1')
+    assert [todo['priority'] for todo in payload['todos']] == ['C', 'B']
+    status, headers, payload = request(api, 'GET', '/todos?search=REPORT|mom&status=all')
+    assert [todo['body'] for todo in payload['todos']] == ['Call Mom', 'report']
+    assert request(api, 'GET', '/todos?search=(')[0] == 400
+    assert request(api, 'GET', '/todos?status=bogus')[0] == 400
+
+
+def test_etags(api):
+    status, headers, payload = request(api, 'GET', '/todos')
+    etag = headers['ETag']
+    assert request(api, 'GET', '/todos', if_none_match=etag) == (304, {'ETag': etag}, None)
+    todo_id = payload['todos'][0]['id']
+    todo_etag = request(api, 'GET', '/todos/%d' % todo_id)[1]['ETag']
+    assert request(api, 'GET', '/todos/%d' % todo_id, if_none_match=todo_etag)[0] == 304
+
+    status, headers, payload = request(api, 'PUT', '/todos/%d' % todo_id, {'raw': '(B) Call Dad @phone'},
+                                       if_match=todo_etag)
+    assert status == 200 and payload['raw'] == '(B) Call Dad @phone' and headers['ETag'] != todo_etag
+    assert request(api, 'GET', '/todos', if_none_match=etag)[0] == 200
+    assert request(api, 'DELETE', '/todos/%d' % todo_id, if_match=todo_etag)[0] == 412
+
+
+def test_crud_saves_file(path, api):
+    status, headers, payload = request(api, 'POST', '/todos', {'raw': 'new @home'})
+    assert status == 201 and headers['Location'] == '/todos/%d' % payload['id']
+    new_id = payload['id']
+    status, headers, payload = request(api, 'PUT', '/todos/%d' % new_id, {
+        'priority': 'A', 'contexts': ['@home'], 'projects': [], 'body': 'newer'})
+    assert payload['raw'] == '(A) newer @home'
+    first_id = request(api, 'GET', '/todos')[2]['todos'][0]['id']
+    assert request(api, 'DELETE', '/todos/%d' % first_id) == (204, {}, None)
+    assert request(api, 'GET', '/todos/%d' % first_id)[0] == 404
+    assert path.read() == ('x 2015-01-05 done thing +work\n(C) fix server +work @office\n'
+                           '(B) report +work\n(A) newer @home\n')
+    assert request(api, 'POST', '/todos', {'raw': ' '})[0] == 400
+    assert request(api, 'PATCH', '/todos')[0] == 405
+
+
+def test_bad_requests(api):
+    assert request(api, 'GET', '/todos/\u00b2')[0] == 404
+    assert request(api, 'POST', '/todos', {'due_date': 5})[0] == 400
+    assert request(api, 'POST', '/todos', {'raw': ['a']})[0] == 400
+    assert request(api, 'POST', '/todos', [])[0] == 400
+
+
+def test_failed_save_leaves_model_alone(api, monkeypatch):
+    status, headers, payload = request(api, 'GET', '/todos')
+    todo_id, etag = payload['todos'][0]['id'], headers['ETag']
+
+    def write(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(http_api.todofile, 'append_todo', write)
+    monkeypatch.setattr(http_api.todofile, 'rewrite', write)
+    assert request(api, 'POST', '/todos', {'raw': 'new'})[0] == 500
+    assert request(api, 'PUT', '/todos/%d' % todo_id, {'raw': 'changed'})[0] == 500
+    assert request(api, 'DELETE', '/todos/%d' % todo_id)[0] == 500
+    assert request(api, 'GET', '/todos', if_none_match=etag)[0] == 304
+    assert request(api, 'GET', '/todos/%d' % todo_id)[2]['raw'] == '(A) Call Mom @phone'
+
+
+def test_reloads_changed_file(path, api):
+    etag = request(api, 'GET', '/todos')[1]['ETag']
+    path.write('(D) edited elsewhere\n')
+    status, headers, payload = request(api, 'GET', '/todos', if_none_match=etag)
+    assert status == 200 and [todo['raw'] for todo in payload['todos']] == ['(D) edited elsewhere']
+
+
+def test_post_appends(path, api, monkeypatch):
+
+    def rewrite(file_path, lines):
+        raise AssertionError('file rewritten')
+    monkeypatch.setattr(http_api.todofile, 'rewrite', rewrite)
+    status, headers, payload = request(api, 'POST', '/todos', {'raw': '@home new', 'creation_date': True})
+    assert status == 201 and payload['raw'] == '%s new @home' % date.today()
+    assert path.read().endswith('(B) report +work\n%s new @home\n' % date.today())
+    assert request(api, 'GET', '/todos')[2]['total'] == 4
+
+
+def test_post_and_put_need_json(path, api):
+    assert request(api, 'POST', '/todos', {'raw': 'new'}, content_type='text/plain')[0] == 415
+    assert request(api, 'PUT', '/todos/1', {'raw': 'new'}, content_type='')[0] == 415
+    assert request(api, 'POST', '/todos', {'raw': 'new'}, content_type='application/json; charset=utf-8')[0] == 201
+    assert path.read().endswith('\nnew\n')
+
+
+def exchange(api, *requests):
+    """Raw response of the server to requests, formatted with its port"""
+    async def send():
+        server = await http_api.start_server(api, 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection(http_api.LOOPBACK, port)
+        for request in requests:
+            writer.write(request.replace(b'PORT', str(port).encode('ascii')))
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(send())
+    finally:
+        loop.close()
+
+
+def test_server_checks_host(api):
+    for host in (b'', b'Host: evil.example:PORT\r\n', b'Host: 127.0.0.1:1\r\n'):
+        response = exchange(api, b'GET /todos HTTP/1.1\r\n' + host + b'\r\n')
+        assert response.startswith(b'HTTP/1.1 421 Misdirected Request\r\n')
+    assert exchange(api, b'GET /todos HTTP/1.1\r\nHost: localhost:PORT\r\nConnection: close\r\n\r\n'
+                    ).startswith(b'HTTP/1.1 200 OK\r\n')
+
+
+def test_server(api):
+    body = b'{"raw": "posted"}'
+    response = exchange(
+        api,
+        b'POST /todos HTTP/1.1\r\nHost: 127.0.0.1:PORT\r\nContent-Type: application/json\r\n'
+        b'Content-Length: %d\r\n\r\n%s' % (len(body), body),
+        b'GET /todos?limit=1 HTTP/1.1\r\nHost: 127.0.0.1:PORT\r\nConnection: close\r\n\r\n')
+    created, listed = response.split(b'HTTP/1.1 ')[1:]
+    assert created.startswith(b'201 Created\r\n') and b'"raw": "posted"' in created
+    assert listed.startswith(b'200 OK\r\n') and b'Connection: close' in listed
+    assert json.loads(listed.split(b'\r\n\r\n', 1)[1])['total'] == 4
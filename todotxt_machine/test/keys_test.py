@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding=utf-8
+from ..keys import KeyBindings
+
+
+def test_get_handler():
+    key_bindings = KeyBindings({})
+    assert key_bindings.get_handler('q', 'listbox') == ('quit', {})
+    assert key_bindings.get_handler('A', 'listbox') == ('set_priority', {'priority': 'A'})
+    assert key_bindings.get_handler('q', 'search') == (None, {})
+    assert key_bindings.get_handler('left', None) == (None, {})
+    assert key_bindings.get_handler(('mouse press', 1, 0, 0), 'listbox') == (None, {})
+
+
+def test_get_handler_user_keys():
+    key_bindings = KeyBindings({'quit': 'Q, ctrl q'})
+    assert key_bindings['quit'] == 'Q, ctrl q'
+    assert key_bindings.get_handler('Q', 'listbox') == ('quit', {})
+    assert key_bindings.get_handler('ctrl q', 'listbox') == ('quit', {})
+    assert key_bindings.get_handler('q', 'listbox') == (None, {})
+
+
+class Recorder(object):
+    def __init__(self, key_bindings):
+        self.key_bindings = key_bindings
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda **kwargs: self.calls.append((name, kwargs))
+
+
+def test_chords():
+    from ..widgets.util import handle_keypress
+    key_bindings = KeyBindings({'top': 'g, g>g', 'bottom': 'g>e'})
+    alarms = []
+    key_bindings.use_alarms(lambda seconds, callback: alarms.append(callback) or len(alarms),
+                            lambda handle: alarms.__setitem__(handle - 1, None))
+    ui = Recorder(key_bindings)
+
+    # keys pass through the todo context first without touching the chord
+    for key in ['d', 'd']:
+        assert not handle_keypress(ui, key, 'todo')
+        assert handle_keypress(ui, key, 'listbox')
+    assert ui.calls == [('delete_todo', {})]
+
+    # 'g' is a binding of its own and the start of two chords
+    assert handle_keypress(ui, 'g', 'listbox')
+    assert handle_keypress(ui, 'e', 'listbox')
+    assert ui.calls[-1] == ('move_selection', {'from_last': True})
+    assert alarms == [None, None]
+
+    # the pending 'g' runs when the chord times out ...
+    handle_keypress(ui, 'g', 'listbox')
+    alarms[-1]()
+    assert ui.calls[-1] == ('move_selection', {'index': 0})
+    # ... or when the next key doesn't continue it
+    del ui.calls[:]
+    handle_keypress(ui, 'g', 'listbox')
+    handle_keypress(ui, 'x', 'listbox')
+    assert ui.calls == [('move_selection', {'index': 0}), ('toggle_complete', {})]
+
+    # a handler in another context cancels it
+    del ui.calls[:]
+    handle_keypress(ui, 'd', 'listbox')
+    handle_keypress(ui, 'enter', 'todo')
+    handle_keypress(ui, 'd', 'listbox')
+    assert ui.calls == [('edit_item', {})]
+
+
+def test_chord_cancelled_by_key_widgets_consume():
+    from ..widgets.util import handle_keypress
+    key_bindings = KeyBindings({'top': 'g, g>g'})
+    ui = Recorder(key_bindings)
+    handle_keypress(ui, 'd', 'listbox')
+    # 'j' moves the listbox focus through its command map and never reaches
+    # handle_keypress, the input filter drops the chord before that
+    assert key_bindings.filter_input(['j']) == ['j']
+    handle_keypress(ui, 'd', 'listbox')
+    assert ui.calls == []
+
+    # a continuation passes through, other keys run the keys typed so far
+    handle_keypress(ui, 'g', 'listbox')
+    assert key_bindings.filter_input(['g']) == ['g']
+    assert ui.calls == []
+    key_bindings.filter_input([('mouse press', 1, 0, 0)])
+    assert ui.calls == [('move_selection', {'index': 0})]
+
+
+def test_vi_command_maps_are_shared():
+    import urwid
+    from ..widgets.vi import ViListBox, ViPile, ViColumns
+    key_bindings = KeyBindings({'down': 'down, j, n'})
+    first = ViListBox(key_bindings, urwid.SimpleListWalker([]))
+    second = ViListBox(key_bindings, urwid.SimpleListWalker([]))
+    assert first._command_map is second._command_map
+    assert first._command_map['n'] == urwid.CURSOR_DOWN
+    assert ViPile(key_bindings, [])._command_map['k'] == urwid.CURSOR_UP
+    assert ViColumns(key_bindings, [])._command_map is ViColumns(key_bindings, [])._command_map
+    assert urwid.command_map['n'] is None
+    assert ViListBox(KeyBindings({}), [])._command_map is not first._command_map
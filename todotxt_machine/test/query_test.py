@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# coding=utf-8
+import io
+import itertools
+from .. import query
+
+LINES = [
+    '(A) 2015-01-02 Call Mom @phone +family due:2015-03-01\n',
+    'x 2015-01-05 done thing +work\n',
+    '(C) fix server +work.infra @office due:2015-02-01\n',
+    '\n',
+    '(B) write report +work @office\n',
+]
+
+
+def run(**filters):
+    out = io.StringIO()
+    sort = filters.pop('sort', None)
+    limit = filters.pop('limit', None)
+    todos = query.filter_todos(query.read_todos(LINES), **filters)
+    query.write_todos(out, query.select(todos, sort, limit=limit))
+    return [line.split(' ', 1)[0] for line in out.getvalue().splitlines()]
+
+
+def test_filters():
+    assert run() == ['1', '3', '5']
+    assert run(status='all') == ['1', '2', '3', '5']
+    assert run(status='done') == ['2']
+    assert run(contexts=['office']) == ['3', '5']
+    assert run(projects=['+work']) == ['3', '5']
+    assert run(projects=['work.infra', 'family']) == ['1', '3']
+    assert run(priorities='AB') == ['1', '5']
+    assert run(due_from='2015-02-01', due_to='2015-02-28') == ['3']
+    assert run(contexts=['@office'], priorities='B') == ['5']
+
+
+def test_sort_and_limit():
+    assert run(sort='due') == ['3', '1', '5']
+    assert run(sort='priority', limit=2) == ['1', '5']
+    assert run(limit=1) == ['1']
+
+
+def test_read_todos_is_lazy():
+    lines = itertools.chain(LINES, iter(lambda: 'endless @phone\n', None))
+    todos = query.filter_todos(query.read_todos(lines), contexts=['@phone'])
+    first = [number for number, todo in itertools.islice(todos, 3)]
+    assert first == [1, 6, 7]
+
+
+def test_format_todo_colors():
+    number, todo = next(query.read_todos(LINES))
+    escapes = {'context': '<c>', 'priority_a': '<a>'}
+    line = query.format_todo(number, todo, escapes)
+    assert line.startswith('1 \x1b[m<a>(A) ')
+    assert '\x1b[m<c>@phone\x1b[m<a>' in line
+    assert line.endswith('\x1b[m\n')
+    assert query.format_todo(number, todo) == '1 ' + LINES[0]
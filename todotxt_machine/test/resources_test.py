@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding=utf-8
+import os
+import subprocess
+import sys
+from .. import resources
+
+
+def test_cached_parse(tmpdir):
+    source = tmpdir.join('data.txt')
+    source.write('a\nb\n')
+    cache_dir = str(tmpdir.join('cache'))
+    calls = []
+
+    def parse(text):
+        calls.append(text)
+        return text.split()
+
+    assert resources.cached_parse(str(source), parse, cache_dir) == ['a', 'b']
+    assert resources.cached_parse(str(source), parse, cache_dir) == ['a', 'b']
+    assert len(calls) == 1
+
+    source.write('a\nb\nc\n')
+    os.utime(str(source), (1, 1))
+    assert resources.cached_parse(str(source), parse, cache_dir) == ['a', 'b', 'c']
+    assert len(calls) == 2
+
+
+def test_resource_path():
+    assert os.path.isfile(resources.resource_path('default_keys.yaml'))
+    assert os.path.isfile(resources.resource_path('quotes.txt'))
+
+
+def test_cli_import_defers_curses_modules():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+    env = dict(os.environ, PYTHONPATH=root)
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        'import sys, todotxt_machine.cli; '
+        'print(sorted(m for m in ("urwid", "yaml", "pkg_resources", "todotxt_machine.widgets") if m in sys.modules))'
+    ], env=env)
+    assert output.decode('utf-8').strip() == '[]'
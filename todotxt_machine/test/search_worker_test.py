@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding=utf-8
+import pytest
+import select
+import time
+from .. import todo
+from ..search_worker import SearchWorker
+
+
+class FakeLoop(object):
+    """Just enough of urwid.MainLoop's watch_file API to drive a SearchWorker"""
+
+    def __init__(self):
+        self.watches = {}
+        self.results = []
+        self.done = []
+
+    def watch_file(self, fd, callback):
+        self.watches[fd] = callback
+        return fd
+
+    def remove_watch_file(self, handle):
+        return self.watches.pop(handle, None) is not None
+
+    def run(self, timeout=10):
+        deadline = time.time() + timeout
+        while self.watches and time.time() < deadline:
+            ready, _, _ = select.select(list(self.watches), [], [], 0.1)
+            for fd in ready:
+                self.watches[fd]()
+
+    def worker(self, todos, time_budget=2.0):
+        return SearchWorker(todos, self.watch_file, self.remove_watch_file,
+                            self.results.extend, self.done.append, time_budget=time_budget)
+
+
+@pytest.fixture
+def loop():
+    return FakeLoop()
+
+
+@pytest.fixture
+def todos():
+    lines = ["task {0} @ctx{1} +proj{2}\n".format(i, i % 7, i % 3) for i in range(1000)]
+    return todo.Todos(lines, 'file.txt', 'archive.txt')
+
+
+def test_search_worker_streams_results(todos, loop):
+    worker = loop.worker(todos)
+    worker.batch_size = 10
+    worker.start("ctx[36] \\+proj1")
+    loop.run()
+    expected = list(todos.search("ctx[36] \\+proj1"))
+    assert loop.done == [True]
+    assert loop.results == expected
+    assert loop.results[0].search_matches == ("ctx3 +proj1",)
+    assert not worker.running()
+
+
+def test_search_worker_invert(todos, loop):
+    loop.worker(todos).start("ctx[0-5]", invert=True)
+    loop.run()
+    assert loop.results == [t for t in todos.todo_items if "@ctx6" in t.raw]
+
+
+def test_search_worker_time_budget(loop):
+    todos = todo.Todos(["a" * 40 + "c\n"], 'file.txt', 'archive.txt')
+    worker = loop.worker(todos, time_budget=0.2)
+    start = time.time()
+    worker.start("(a+)+b")
+    loop.run()
+    assert loop.done == [False]
+    assert loop.results == []
+    assert time.time() - start < 5
+
+
+def test_search_worker_cancel(loop):
+    todos = todo.Todos(["a" * 40 + "c\n", "abc\n"], 'file.txt', 'archive.txt')
+    worker = loop.worker(todos, time_budget=0)
+    worker.start("(a+)+b")
+    worker.start("b.")
+    assert len(loop.watches) == 1
+    loop.run()
+    assert loop.done == [True]
+    assert loop.results == [todos[1]]
+    worker.start("(a+)+b")
+    worker.cancel()
+    assert not worker.running()
+    assert loop.watches == {}
+
+
+def test_search_worker_rejects_invalid_search(todos, loop):
+    worker = loop.worker(todos)
+    with pytest.raises(ValueError):
+        worker.start("(unclosed")
+    assert not worker.running()
+    assert loop.watches == {} and loop.done == []
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# coding=utf-8
+import urwid
+from ..widgets.todo import BorderedText
+
+
+def render(widget, width):
+    urwid.set_encoding('UTF-8')
+    canvas = widget.render((width,))
+    return [line.decode('utf-8') for line in canvas.text], canvas
+
+
+def test_bordered_text():
+    widget = BorderedText(urwid.Text([('priority_a', u'(A)'), u' Call Mom and Dad']),
+                          top_left_title=('due_date', u'due:2016-01-01'),
+                          bottom_right_title=[('context', u'@phone'), u' ', ('project', u'+Family')],
+                          border_color='priority_a')
+    assert widget.rows((20,)) == 4
+    lines, canvas = render(widget, 20)
+    assert lines == [
+        u'┌─due:2016-01-01───┐',
+        u'│(A) Call Mom and  │',
+        u'│Dad               │',
+        u'└───@phone +Family─┘',
+    ]
+    attrs = [[attr for attr, cs, text in row] for row in canvas.content()]
+    assert attrs[0] == ['priority_a', 'due_date', 'priority_a']
+    assert attrs[1] == ['priority_a', None, 'priority_a']
+    assert attrs[3] == ['priority_a', 'context', None, 'project', 'priority_a']
+
+
+def test_bordered_text_clips_titles():
+    widget = BorderedText(urwid.Text(u'x'), top_left_title=u'a long title',
+                          bottom_right_title=[('context', u'@a'), u' ', ('project', u'+b')])
+    lines, canvas = render(widget, 8)
+    assert lines == [u'┌─a lon┐', u'│x     │', u'└@a +b─┘']
+
+
+def test_bordered_text_too_narrow_for_border():
+    widget = BorderedText(urwid.Text(u'abcd'), top_left_title=u'title')
+    assert widget.rows((2,)) == 2
+    lines, canvas = render(widget, 2)
+    assert lines == [u'ab', u'cd']
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# coding=utf-8
+import io
+from datetime import date, timedelta
+from .. import todofile
+
+
+def test_append_todo(tmpdir):
+    path = tmpdir.join('todo.txt')
+    path.write('x 2015-01-01 done\n(A) no trailing newline')
+    tomorrow = str(date.today() + timedelta(days=1))
+    assert todofile.append_todo(str(path), '@phone Call Mom !tom') == (3, 'Call Mom due:%s @phone' % tomorrow)
+    assert todofile.append_todo(str(path), 'Plan +trip', add_creation_date=True) == (
+        4, '%s Plan +trip' % date.today())
+    assert path.read() == (
+        'x 2015-01-01 done\n(A) no trailing newline\n'
+        'Call Mom due:%s @phone\n%s Plan +trip\n' % (tomorrow, date.today()))
+
+
+def test_append_todo_empty_file(tmpdir):
+    path = tmpdir.join('todo.txt')
+    path.write('')
+    assert todofile.append_todo(str(path), '(B) 2015-02-03 report') == (1, '2015-02-03 (B) report')
+    assert path.read() == '2015-02-03 (B) report\n'
+
+
+def no_scan(f):
+    raise AssertionError('file scanned again')
+
+
+def test_append_todo_counts_lines_once(tmpdir, monkeypatch):
+    path = tmpdir.join('todo.txt')
+    path.write('one\ntwo\n')
+    count_lines = todofile._count_lines
+    assert todofile.append_todo(str(path), 'three') == (3, 'three')
+
+    monkeypatch.setattr(todofile, '_count_lines', no_scan)
+    assert todofile.append_todo(str(path), 'four') == (4, 'four')
+
+    # written by something else, counted again
+    monkeypatch.setattr(todofile, '_count_lines', count_lines)
+    path.write('one\n')
+    assert todofile.append_todo(str(path), 'two') == (2, 'two')
+
+
+def test_append_todo_line_count_outlives_process(tmpdir, monkeypatch):
+    path = tmpdir.join('todo.txt')
+    path.write('one\ntwo\n')
+    assert todofile.append_todo(str(path), 'three') == (3, 'three')
+
+    # a new process with a warm stamp in the cache reads nothing but the last byte
+    monkeypatch.setattr(todofile, '_line_counts', {})
+    reads = []
+    open_file = io.open
+
+    def counting_open(*args, **kwargs):
+        f = open_file(*args, **kwargs)
+        if args[0] == str(path):
+            read = f.read
+            f.read = lambda size=-1: reads.append(size) or read(size)
+        return f
+    monkeypatch.setattr(todofile.io, 'open', counting_open)
+    monkeypatch.setattr(todofile, '_count_lines', no_scan)
+    assert todofile.append_todo(str(path), 'four') == (4, 'four')
+    assert reads == [1]
+
+
+def test_import_todos(tmpdir):
+    path = tmpdir.join('todo.txt')
+    path.write('(A) no trailing newline')
+    items = iter(['@phone Call Mom !tom\n', '\n', 'Plan +trip\n', '(B) 2015-02-03 report'])
+    assert todofile.import_todos(str(path), items, add_creation_date=True) == 3
+    tomorrow = str(date.today() + timedelta(days=1))
+    assert path.read() == (
+        '(A) no trailing newline\n'
+        '%s Call Mom due:%s @phone\n%s Plan +trip\n2015-02-03 (B) report\n' % (date.today(), tomorrow, date.today()))
+    assert tmpdir.listdir() == [path]
+
+
+def test_import_todos_leaves_file_alone_on_error(tmpdir):
+    path = tmpdir.join('todo.txt')
+    path.write('first\n')
+
+    def items():
+        yield 'second'
+        raise ValueError
+    try:
+        todofile.import_todos(str(path), items())
+    except ValueError:
+        pass
+    assert path.read() == 'first\n'
+    assert tmpdir.listdir() == [path]
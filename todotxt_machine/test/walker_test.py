@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# coding=utf-8
+import pytest
+import urwid
+from ..widgets.walker import TodoListWalker
+
+
+@pytest.fixture
+def built():
+    """Entries the walker built a widget for, in order"""
+    return []
+
+
+@pytest.fixture
+def walker(request, built):
+    """Walker over range(10), or range(n) with indirect parametrization"""
+    def make_widget(entry):
+        built.append(entry)
+        return urwid.Text(str(entry))
+    return TodoListWalker(make_widget, range(getattr(request, 'param', 10)))
+
+
+@pytest.mark.parametrize('walker', [50000], indirect=True)
+def test_walker_builds_visible_rows_only(walker, built):
+    listbox = urwid.ListBox(walker)
+    listbox.render((40, 20), focus=True)
+    assert len(built) < 50
+    walker.set_focus(30000)
+    canvas = listbox.render((40, 20), focus=True)
+    assert b'30000' in b''.join(canvas.text)
+    assert len(built) < 100
+
+
+@pytest.mark.parametrize('walker', [5000], indirect=True)
+def test_walker_prunes_far_widgets(walker):
+    for position in range(0, 5000, 7):
+        walker.set_focus(position)
+        walker.get_focus()
+    assert len(walker.widgets()) <= 4 * walker.margin + 1
+
+
+def test_walker_delete_keeps_widgets_in_place(walker):
+    widget = walker[5]
+    walker.set_focus(5)
+    del walker[2]
+    assert len(walker) == 9
+    assert walker[4] is widget
+    assert walker.get_focus() == (widget, 4)
+    assert walker.index(5) == 4
+    walker.pop()
+    walker.set_focus(7)
+    del walker[7]
+    assert walker.get_focus()[1] == 6
+
+
+@pytest.mark.parametrize('walker', [1000], indirect=True)
+def test_walker_reconcile_swap_touches_two_rows(walker, built):
+    entries = list(walker.entries)
+    walker.set_focus(500)
+    widgets = [walker[i] for i in range(490, 510)]
+    del built[:]
+    entries[500], entries[501] = entries[501], entries[500]
+    assert walker.reconcile(entries) == 2
+    assert walker.get_focus()[1] == 501
+    assert [walker[i] for i in range(490, 510)] == widgets[:10] + [widgets[11], widgets[10]] + widgets[12:]
+    assert built == []
+
+
+def test_walker_reconcile_inserts_and_deletes(walker, built):
+    widgets = [walker[i] for i in range(10)]
+    walker.set_focus(6)
+    del built[:]
+    assert walker.reconcile([0, 1, 'new', 2, 4, 5, 6, 7, 8, 9]) == 2
+    assert walker.get_focus() == (widgets[6], 6)
+    assert walker[3] is widgets[2]
+    assert walker[2] is not None and built == ['new']
+    assert walker.reconcile([('project', 'a'), 9]) == 1
+    assert walker.get_focus()[1] == 1
+    assert walker[1] is widgets[9]
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""
+Changes to a todo.txt file that don't need the whole file parsed into Todos,
+for the command line subcommands.
+"""
+import hashlib
+import io
+import marshal
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from todotxt_machine.resources import cache_directory
+from todotxt_machine.todo import Todo, Todos
+
+_chunk_size = 1 << 20
+
+# os.rename won't replace an existing file on Windows, os.replace (Python
+# 3.3+) does everywhere
+_replace = getattr(os, 'replace', os.rename)
+
+# realpath -> (stamp of the file, number of lines) as append_todo left it,
+# also kept in a file under the cache directory for the next process
+_line_counts = {}
+
+
+def _same_file(f, file_path):
+    try:
+        return os.path.samestat(os.fstat(f.fileno()), os.stat(file_path))
+    except OSError:
+        return False
+
+
+@contextmanager
+def locked_file(file_path, mode='a+b'):
+    """
+    file_path opened with an exclusive advisory lock held. If the file was
+    replaced (by import_todos) while waiting for the lock, the new file is
+    opened and locked instead.
+    """
+    while True:
+        f = io.open(file_path, mode)
+        if fcntl is None:
+            break
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        if _same_file(f, file_path):
+            break
+        f.close()
+    try:
+        yield f
+    finally:
+        f.close()  # flushes before the lock goes away with the descriptor
+
+
+def file_stamp(file_path):
+    """Changes whenever file_path is written to or replaced"""
+    return _stamp(os.stat(file_path))
+
+
+def _stamp(stat):
+    return (stat.st_ino, getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size)
+
+
+def normalize(item, add_creation_date=False):
+    """
+    item as Todo.update would store it: fields reordered by build_raw and
+    !t / !tom / !0 due date macros expanded
+    """
+    todo = Todo('', 0)
+    todo.update(item)
+    if add_creation_date:
+        todo.add_creation_date()
+    return todo.raw
+
+
+def _count_lines(f):
+    """Number of newlines in f"""
+    f.seek(0)
+    return sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(_chunk_size), b''))
+
+
+def _line_count_file(key, cache_dir=None):
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir or cache_directory(), 'lines-{0}.marshal'.format(digest))
+
+
+def _load_line_count(key, stamp, cache_dir=None):
+    """Number of lines of key when it had stamp, None if that isn't known"""
+    cached_stamp, lines = _line_counts.get(key, (None, None))
+    if cached_stamp == stamp:
+        return lines
+    try:
+        with open(_line_count_file(key, cache_dir), 'rb') as f:
+            cached_key, cached_stamp, lines = marshal.load(f)
+        if cached_key == key and tuple(cached_stamp) == stamp:
+            return lines
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        pass
+    return None
+
+
+def _store_line_count(key, stamp, lines, cache_dir=None):
+    _line_counts[key] = (stamp, lines)
+    cache_file = _line_count_file(key, cache_dir)
+    try:
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        temp_file = '{0}.{1}.tmp'.format(cache_file, os.getpid())
+        with open(temp_file, 'wb') as f:
+            marshal.dump((key, stamp, lines), f)
+        _replace(temp_file, cache_file)
+    except (IOError, OSError):
+        pass  # read only home, count again next time
+
+
+def append_todo(file_path, item, add_creation_date=False, cache_dir=None):
+    """
+    Append a single todo to file_path with one locked write, without parsing
+    the todos already there. Returns (line number, raw text) of the new todo.
+
+    Only the last byte is read to find a missing newline. The line count is
+    kept with the file stamp in the cache directory, so the file is scanned
+    only if something else wrote to it since the last call, in this process
+    or another one.
+    """
+    raw = normalize(item, add_creation_date)
+    key = os.path.realpath(file_path)
+    with locked_file(file_path) as f:
+        stat = os.fstat(f.fileno())
+        unterminated = False
+        if stat.st_size:
+            f.seek(-1, os.SEEK_END)
+            unterminated = f.read(1) != b'\n'
+        lines = _load_line_count(key, _stamp(stat), cache_dir)
+        if lines is None:
+            lines = _count_lines(f)
+        data = raw.encode('utf-8') + b'\n'
+        if unterminated:
+            data = b'\n' + data
+        f.write(data)
+        f.flush()
+        lines += 1 + unterminated
+        _store_line_count(key, _stamp(os.fstat(f.fileno())), lines, cache_dir)
+    return lines, raw
+
+
+@contextmanager
+def _replacement(file_path):
+    """
+    Binary file to write the new content of file_path to. On success it
+    replaces file_path in one rename, so readers see the old file or the
+    new one and never a partial write.
+    """
+    fd, temp_path = tempfile.mkstemp(prefix='.todo-', dir=os.path.dirname(os.path.abspath(file_path)))
+    try:
+        with io.open(fd, 'wb', buffering=_chunk_size) as out:
+            yield out
+            out.flush()
+            os.fsync(out.fileno())
+        shutil.copymode(file_path, temp_path)
+        _replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def append_lines(file_path, lines):
+    """
+    Append every line of the lines iterable to file_path, streaming the
+    current file and the new lines into its replacement. Returns the number
+    of lines appended.
+    """
+    count = 0
+    with locked_file(file_path) as f:
+        with _replacement(file_path) as out:
+            f.seek(0)
+            last = b'\n'
+            for chunk in iter(lambda: f.read(_chunk_size), b''):
+                out.write(chunk)
+                last = chunk[-1:]
+            if last != b'\n':
+                out.write(b'\n')
+            for line in lines:
+                out.write(line.encode('utf-8') + b'\n')
+                count += 1
+    return count
+
+
+def rewrite(file_path, lines):
+    """Replace the content of file_path with lines in one rename"""
+    with locked_file(file_path):
+        with _replacement(file_path) as out:
+            for line in lines:
+                out.write(line.encode('utf-8') + b'\n')
+
+
+def update_line(file_path, line_number, change):
+    """
+    Replace line line_number (counting from 1) of file_path with
+    change(todo), a Todo parsed from it, which should return the new raw
+    text. Raises ValueError if there is no todo on that line. Returns the
+    new raw text.
+    """
+    with locked_file(file_path) as f:
+        f.seek(0)
+        with _replacement(file_path) as out:
+            raw = None
+            for number, line in enumerate(f, 1):
+                if number == line_number and line.strip():
+                    raw = change(Todos.create_todo(line.decode('utf-8'), number - 1))
+                    line = raw.encode('utf-8') + b'\n'
+                out.write(line)
+            if raw is None:
+                raise ValueError('no todo on line {0}'.format(line_number))
+    return raw
+
+
+def complete_todo(file_path, line_number):
+    """Mark the todo on line_number complete, see update_line"""
+    def complete(todo):
+        if not todo.is_complete():
+            todo.complete()
+        return todo.raw
+    return update_line(file_path, line_number, complete)
+
+
+def import_todos(file_path, items, add_creation_date=False):
+    """
+    Append every non blank line of the items iterable to file_path,
+    normalized like append_todo, with append_lines. Returns the number of
+    todos imported.
+    """
+    return append_lines(file_path, (normalize(item, add_creation_date) for item in items if item.strip()))
@@ -2,10 +2,15 @@
 import urwid
 import re
 import subprocess as sub
+from todotxt_machine.cache import LRUCache, patterns
+from todotxt_machine.search_index import is_literal
+from todotxt_machine.search_worker import SearchWorker
+from todotxt_machine.todo import Todo
 from todotxt_machine.widgets.todo import TodoWidget
 from todotxt_machine.widgets.util import handle_keypress, log
 from todotxt_machine.widgets.search import SearchWidget
 from todotxt_machine.widgets.vi import ViListBox, ViColumns, ViPile, ViCheckbox
+from todotxt_machine.widgets.walker import TodoListWalker
 
 
 class UrwidUI(object):
@@ -66,7 +71,12 @@ class UrwidUI(object):
         ),
     ]
 
-    def __init__(self, todos, key_bindings, colorscheme):
+    # Lists this long run regex searches in a SearchWorker child process
+    background_search_min = 5000
+    # Number of todo row widgets kept around for reuse across redraws
+    row_cache_size = 2000
+
+    def __init__(self, todos, key_bindings, colorscheme, search_timeout=2.0):
         self.sort_order = 4
         self.display_style = 2
         self.wrap_style = 0
@@ -98,6 +108,11 @@ class UrwidUI(object):
         self.frame = None
         self.listbox = None
         self.search_box = None
+        self.search_worker = None
+        self.search_timeout = search_timeout
+        self.last_drawn_project = None
+        self.drawn_row_settings = None
+        self.row_cache = LRUCache(self.row_cache_size)
 
         self.finalized_search_string = None
 
@@ -147,7 +162,9 @@ class UrwidUI(object):
             # for header_column in self.frame.header.original_widget.contents:
             #     header_column[0].set_wrap_mode('space')
         else:
-            self.help_panel = self.create_help_panel()
+            # key bindings don't change while running, build the panel once
+            if self.help_panel is None:
+                self.help_panel = self.create_help_panel()
             self.view.contents.append((self.help_panel, self.view.options(width_type='weight', width_amount=3)))
             self.view.set_focus(1)
             self.help_panel_is_open = True
@@ -207,7 +224,6 @@ class UrwidUI(object):
         if not self.filtering and not self.searching:
             if focus_index+1 < len(self.listbox.body):
                 self.todos.swap(focus_index, focus_index + 1)
-                self.delete_todo_widgets()
                 self.draw_list()
                 self.move_selection(focus_index + 1)
 
@@ -216,7 +232,6 @@ class UrwidUI(object):
         if not self.filtering and not self.searching:
             if focus_index > 0:
                 self.todos.swap(focus_index, focus_index - 1)
-                self.delete_todo_widgets()
                 self.draw_list()
                 self.move_selection(focus_index - 1)
 
@@ -226,19 +241,30 @@ class UrwidUI(object):
 
     def archive_done_todos(self):
         if self.todos.archive_done():
-            self.delete_todo_widgets()
             self.reload_todos_from_memory()
             self.move_selection(0)
             self.update_header()
 
     def reload_todos_from_file(self, button=None):
-        self.delete_todo_widgets()
+        # Todos.merge keeps the unchanged todos, so reconciling the list
+        # only rebuilds the rows of changed lines and keeps the focus
+        if self.search_worker:
+            self.search_worker.cancel()
         self.todos.reload_from_file()
-        self.reload_todos_from_memory()
-        self.draw_list()
+        if self.sort_options[self.sort_order]['name'] != 'Unsorted':
+            self.run_sort()  # the file order is the unsorted order
+        if self.filtering:
+            self.filter_todo_list()
+        else:
+            self.reload_todos_from_memory()
         self.update_header("Reloaded")
 
     def quit(self):
+        if self.search_worker:
+            self.search_worker.cancel()
+        # to size row_cache_size and the pattern cache from real sessions
+        log.info('row cache: %s', self.row_cache.stats())
+        log.info('search pattern cache: %s', patterns.stats())
         raise urwid.ExitMainLoop()
 
     def set_priority(self, priority):
@@ -319,8 +345,7 @@ class UrwidUI(object):
         else:  # position == 'insert_before':
             newtodo = self.todos.insert(focus_index, '', add_creation_date=False)
         if projects:
-            newtodo.projects = projects
-            newtodo.raw = newtodo.build_raw()
+            newtodo.update(' '.join(projects))
 
         self.refresh()
         self.focus_todo(newtodo, edit=True)
@@ -381,9 +406,32 @@ class UrwidUI(object):
             self.delete_todo_widgets()
             self.searching = True
 
+            if self.search_in_background(search_string):
+                # results are streamed in by search_results_received
+                self.displayed_todos = []
+                self.last_drawn_project = None
+                self.search_worker.start(search_string, invert=invert)
+                return
+            if self.search_worker:
+                self.search_worker.cancel()
             self.displayed_todos = list(self.todos.search(search_string, invert=invert))
             self.draw_list()
 
+    def search_in_background(self, search_string):
+        # Literal searches are linear and narrowed by Todos.search, only
+        # regexes can backtrack badly enough to freeze the main loop
+        return (self.search_worker is not None and
+                not is_literal(search_string) and
+                len(self.todos.todo_items) >= self.background_search_min)
+
+    def search_results_received(self, todos):
+        self.displayed_todos.extend(todos)
+        self.draw_list(todos)
+
+    def search_finished(self, complete):
+        if not complete:
+            self.update_header("Search stopped after {0}s".format(self.search_timeout))
+
     def start_search(self):
         self.searching = True
         self.update_footer()
@@ -400,9 +448,8 @@ class UrwidUI(object):
         self.search_string = ''
         self.frame.set_focus('body')
         self.update_header()
-        for widget in self.listbox.body:
-            if hasattr(widget, 'update_todo'):
-                widget.update_todo()
+        # rows without search highlighting come back from the row cache
+        self.redraw_list()
 
     def clear_filters(self, refresh=True, button=None):
         self.filtering = False
@@ -412,6 +459,8 @@ class UrwidUI(object):
             self.redraw_widgets()
 
     def clear_searches(self, refresh=True, button=None):
+        if self.search_worker:
+            self.search_worker.cancel()
         self.searching = False
         self.search_string = ''
         if refresh:
@@ -422,7 +471,6 @@ class UrwidUI(object):
         self.clear_searches(refresh)
 
     def redraw_widgets(self, focus_index=0):
-        self.delete_todo_widgets()
         # TODO should perform any search, filtering, sorting
         self.reload_todos_from_memory()
         self.view.set_focus(focus_index)
@@ -497,7 +545,7 @@ class UrwidUI(object):
             [urwid.Divider(u'─')] +
             [urwid.AttrWrap(ViCheckbox(c, state=(c in self.active_contexts), on_state_change=self.checkbox_clicked, user_data=['context', c]), 'context_dialog_color', 'context_selected') for c in self.todos.all_contexts()] +
             [urwid.Divider(u'─')] +
-            [urwid.AttrWrap(ViCheckbox(p, state=(p in self.active_projects), on_state_change=self.checkbox_clicked, user_data=['project', p]), 'project_dialog_color', 'project_selected') for p in self.todos.all_projects()] +
+            [urwid.AttrWrap(ViCheckbox(u'{0} ({1})'.format(p, self.todos.project_counts(p)[0]), state=(p in self.active_projects), on_state_change=self.checkbox_clicked, user_data=['project', p]), 'project_dialog_color', 'project_selected') for p in self.todos.all_projects()] +
             [urwid.Divider(u'─')] +
             [urwid.AttrMap(urwid.Button(['Clear ', ('header_file_dialog_color','F'), 'ilters'], on_press=self.clear_filters), 'dialog_color', 'plain_selected') ]
         )
@@ -516,29 +564,65 @@ class UrwidUI(object):
         return w
 
     def delete_todo_widgets(self):
-        for i in range(len(self.listbox.body)-1, -1, -1):
-            self.listbox.body.pop(i)
+        self.listbox.body.set_entries([])
 
-    def draw_list(self):
+    def display_settings(self):
         wrap = self.wrap_options[self.wrap_style]['display']
         border = self.display_options[self.display_style]['display']
         project_sort = self.sort_options[self.sort_order].get('allow_tree', False)
-        last_project = None
         if border == 'tree' and not project_sort:
             border = 'no border'
-        for t in self.displayed_todos:
+        return wrap, border
+
+    def row_settings(self):
+        # everything a row widget depends on besides its todo
+        highlighted = self.search_string if self.searching and self.search_string else None
+        return self.display_settings() + (highlighted,)
+
+    def create_row_widget(self, entry):
+        """Build the listbox widget for a todo or a project header"""
+        if not isinstance(entry, Todo):
+            return urwid.Text(entry)
+        key = (entry, entry.version) + self.row_settings()
+        widget = self.row_cache.get(key)
+        if widget is None or widget.editing:
+            wrap, border = self.display_settings()
+            widget = TodoWidget(entry, self.key_bindings, self.colorscheme, self,
+                                wrapping=wrap,
+                                border=border)
+            self.row_cache[key] = widget
+        return widget
+
+    def draw_list(self, todos=None):
+        """Show todos after the current rows, or show every displayed todo"""
+        border = self.display_settings()[1]
+        appending = todos is not None
+        if appending:
+            last_project = self.last_drawn_project
+        else:
+            todos = self.displayed_todos
+            last_project = None
+        entries = []
+        for t in todos:
             if border == 'tree' and t.projects:
                 project = t.projects[0]
                 if project != last_project:
                     depth = project.count('.')
-                    self.listbox.body.append(urwid.Text(('project', '    ' * depth + project)))
+                    pending, done = self.todos.project_counts(project)
+                    entries.append(('project', u'{0}{1} ({2} pending, {3} done)'.format(
+                        '    ' * depth, project, pending, done)))
                 last_project = project
-            self.listbox.body.append(TodoWidget(t, self.key_bindings, self.colorscheme, self,
-                                                wrapping=wrap,
-                                                border=border))
+            entries.append(t)
+        self.last_drawn_project = last_project
+        if appending:
+            self.listbox.body.extend(entries)
+        elif self.row_settings() == self.drawn_row_settings:
+            self.listbox.body.reconcile(entries)
+        else:
+            self.listbox.body.set_entries(entries)
+        self.drawn_row_settings = self.row_settings()
 
     def redraw_list(self):
-        self.delete_todo_widgets()
         self.draw_list()
 
     def refresh(self, reset=True):
@@ -552,11 +636,13 @@ class UrwidUI(object):
             self.focus_todo(todo.todo)
 
     def focus_todo(self, todo, edit=False):
-        for i, widget in enumerate(self.listbox.body):
-            if isinstance(widget, TodoWidget) and widget.todo == todo:
-                self.listbox.set_focus(i)
-                if edit:
-                    widget.edit_item()
+        try:
+            index = self.listbox.body.index(todo)
+        except ValueError:
+            return
+        self.listbox.set_focus(index)
+        if edit:
+            self.listbox.body[index].edit_item()
 
     def reload_todos_from_memory(self):
         self.displayed_todos = self.todos.todo_items
@@ -582,7 +668,6 @@ class UrwidUI(object):
             self.clear_filters()
 
     def filter_todo_list(self):
-        self.delete_todo_widgets()
         self.displayed_todos = list(self.todos.filter_contexts_and_projects(self.active_contexts, self.active_projects))
         self.filtering = True
         self.draw_list()
@@ -612,7 +697,7 @@ class UrwidUI(object):
     def main(self):
         urwid.set_encoding('UTF-8')
 
-        self.listbox = ViListBox(self.key_bindings, urwid.SimpleListWalker([]))
+        self.listbox = ViListBox(self.key_bindings, TodoListWalker(self.create_row_widget))
         self.refresh()
         self.header = self.create_header()
         self.footer = self.create_footer()
@@ -623,6 +708,11 @@ class UrwidUI(object):
             ('weight', 2, self.frame)
         ])
 
-        self.loop = urwid.MainLoop(self.view, self.palette, unhandled_input=self.keystroke)
+        self.loop = urwid.MainLoop(self.view, self.palette, unhandled_input=self.keystroke,
+                                   input_filter=self.key_bindings.filter_input)
         self.loop.screen.set_terminal_properties(colors=256)
+        self.key_bindings.use_alarms(self.loop.set_alarm_in, self.loop.remove_alarm)
+        self.search_worker = SearchWorker(self.todos, self.loop.watch_file, self.loop.remove_watch_file,
+                                          self.search_results_received, self.search_finished,
+                                          time_budget=self.search_timeout)
         self.loop.run()
@@ -60,12 +60,14 @@ class TodoWidget(urwid.Button):
             bc = 'plain'
             if self.todo.priority and self.todo.priority in 'ABCDEF':
                 bc = "priority_{0}".format(self.todo.priority.lower())
-            text = TodoLineBox(text, top_left_title=lt, bottom_right_title=t, border_color=bc,)
+            text = BorderedText(text, top_left_title=lt, bottom_right_title=t, border_color=bc)
         elif self.border == 'tree':
             if self.todo.projects:
                 project = self.todo.projects[0]
                 depth = project.count('.')
-                colored_list = self.todo.highlight(show_projects=False)
+                # copy the cached markup before indenting it
+                attr, colored_list = self.todo.highlight(show_projects=False)
+                colored_list = (attr, list(colored_list))
                 if isinstance(colored_list[1][0], basestring):
                     colored_list[1][0] = u'    ' * (depth+1) + colored_list[1][0]
                 text = urwid.Text(colored_list, wrap=self.wrapping)
@@ -124,65 +126,83 @@ class TodoWidget(urwid.Button):
             return key
 
 
-class TodoLineBox(urwid.WidgetDecoration, urwid.WidgetWrap):
-    def __init__(self, original_widget, top_left_title="", bottom_right_title="", border_color='plain',
+class BorderedText(urwid.Widget):
+    """
+    Text inside a one character border with a title on the top left and
+    one on the bottom right.
+
+    Rendered straight into a single TextCanvas instead of the Pile of
+    Columns, Dividers, SolidFills and AttrMaps TodoLineBox used to build
+    for every row. Titles are clipped to the width of the border, and below
+    three columns the text is drawn without one.
+    """
+    _sizing = frozenset(['flow'])
+
+    def __init__(self, text, top_left_title="", bottom_right_title="", border_color='plain',
                  tlcorner=u'┌', tline=u'─', lline=u'│', trcorner=u'┐', blcorner=u'└', rline=u'│',
                  bline=u'─', brcorner=u'┘'):
-        """
-        Draw a line around original_widget.
-
-        Use 'title' to set an initial title text with will be centered
-        on top of the box.
-
-        You can also override the widgets used for the lines/corners:
-            tline: top line
-            bline: bottom line
-            lline: left line
-            rline: right line
-            tlcorner: top left corner
-            trcorner: top right corner
-            blcorner: bottom left corner
-            brcorner: bottom right corner
-
-        """
-
-        tline, bline = urwid.AttrMap(urwid.Divider(tline), border_color),   urwid.AttrMap(urwid.Divider(bline), border_color)
-        lline, rline = urwid.AttrMap(urwid.SolidFill(lline), border_color), urwid.AttrMap(urwid.SolidFill(rline), border_color)
-        tlcorner, trcorner = urwid.AttrMap(urwid.Text(tlcorner), border_color), urwid.AttrMap(urwid.Text(trcorner), border_color)
-        blcorner, brcorner = urwid.AttrMap(urwid.Text(blcorner), border_color), urwid.AttrMap(urwid.Text(brcorner), border_color)
-
-        self.ttitle_widget = urwid.Text(top_left_title)
-        self.tline_widget = urwid.Columns([
-            ('fixed', 1, tline),
-            ('flow', self.ttitle_widget),
-            tline,
-        ])
-        self.btitle_widget = urwid.Text(bottom_right_title)
-        self.bline_widget = urwid.Columns([
-            bline,
-            ('flow', self.btitle_widget),
-            ('fixed', 1, bline),
-        ])
-
-        middle = urwid.Columns([
-            ('fixed', 1, lline),
-            original_widget,
-            ('fixed', 1, rline),
-        ], box_columns=[0, 2], focus_column=1)
-
-        top = urwid.Columns([
-            ('fixed', 1, tlcorner),
-            self.tline_widget,
-            ('fixed', 1, trcorner)
-        ])
-
-        bottom = urwid.Columns([
-            ('fixed', 1, blcorner),
-            self.bline_widget,
-            ('fixed', 1, brcorner)
-        ])
-
-        pile = urwid.Pile([('flow', top), middle, ('flow', bottom)], focus_item=1)
-
-        urwid.WidgetDecoration.__init__(self, original_widget)
-        urwid.WidgetWrap.__init__(self, pile)
+        super(BorderedText, self).__init__()
+        self.text = text
+        self.top_left_title = top_left_title
+        self.bottom_right_title = bottom_right_title
+        self.border_color = border_color
+        self.tlcorner, self.tline, self.trcorner = tlcorner, tline, trcorner
+        self.lline, self.rline = lline, rline
+        self.blcorner, self.bline, self.brcorner = blcorner, bline, brcorner
+
+    def rows(self, size, focus=False):
+        maxcol, = size
+        if maxcol < 3:
+            return self.text.rows(size, focus)
+        return self.text.rows((maxcol - 2,), focus) + 2
+
+    def render(self, size, focus=False):
+        maxcol, = size
+        if maxcol < 3:
+            return self.text.render(size, focus)
+        bc = self.border_color
+        segment = self._segment
+        rows = []
+
+        title, width = self._title(self.top_left_title, maxcol - 3)
+        rows.append([segment(bc, self.tlcorner + self.tline)] + title +
+                    [segment(bc, self.tline * (maxcol - 3 - width) + self.trcorner)])
+
+        left, right = segment(bc, self.lline), segment(bc, self.rline)
+        for line in self.text.render((maxcol - 2,), focus).content():
+            rows.append([left] + [(attr, text, [(cs, len(text))]) for attr, cs, text in line] + [right])
+
+        title, width = self._title(self.bottom_right_title, maxcol - 3)
+        rows.append([segment(bc, self.blcorner + self.bline * (maxcol - 3 - width))] + title +
+                    [segment(bc, self.bline + self.brcorner)])
+
+        text, attr, cs = [], [], []
+        for row in rows:
+            text.append(b''.join(t for _, t, _ in row))
+            attr.append([(a, len(t)) for a, t, _ in row])
+            cs.append([run for _, _, runs in row for run in runs])
+        return urwid.TextCanvas(text, attr, cs, maxcol=maxcol)
+
+    @staticmethod
+    def _segment(attr, text):
+        encoded, cs = urwid.util.apply_target_encoding(text)
+        return attr, encoded, cs
+
+    @classmethod
+    def _title(cls, markup, width):
+        """Segments of markup clipped to width columns, and their width"""
+        text, runs = urwid.util.decompose_tagmarkup(markup)
+        if not runs and text:
+            runs = [(None, len(text))]
+        segments = []
+        used = position = 0
+        for attr, length in runs:
+            part = text[position:position + length]
+            position += length
+            end, part_width = urwid.calc_text_pos(part, 0, len(part), width - used)
+            if end:
+                segments.append(cls._segment(attr, part[:end]))
+                used += part_width
+            if end < len(part):
+                break
+        return segments, used
@@ -2,16 +2,26 @@
 import logging
 import os.path as op
 
+from todotxt_machine.keys import CHORD_PENDING
+
 logging.basicConfig(filename=op.expanduser('~/.todotxt_machine.log'), level=logging.INFO)
 
 log = logging.getLogger()
 
 
 def handle_keypress(widget, key, context):
-    handler, kwargs = widget.key_bindings.get_handler(key, context)
+    key_bindings = widget.key_bindings
+    handler = None
+    if key_bindings.chords:
+        handler, kwargs = key_bindings.get_chord_handler(widget, key, context)
+        if handler == CHORD_PENDING:
+            return True
+    if not handler:
+        handler, kwargs = key_bindings.get_handler(key, context)
 
     if not handler:
         return False
+    key_bindings.cancel_chord()
     log.debug('running %s %s', handler, kwargs)
     getattr(widget, handler)(**kwargs)
     return True
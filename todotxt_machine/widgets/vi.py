@@ -2,21 +2,32 @@
 import urwid
 
 
+def vi_command_map(key_bindings, commands):
+    """
+    Copy of urwid.command_map with the keys bound to each (binding name,
+    command) pair in commands, built once per KeyBindings and shared by
+    every widget asking for the same commands.
+    """
+    command_map = key_bindings.command_maps.get(commands)
+    if command_map is None:
+        command_map = urwid.command_map.copy()
+        for bind, command in commands:
+            for key in key_bindings.get_key_binding(bind):
+                command_map[key] = command
+        key_bindings.command_maps[commands] = command_map
+    return command_map
+
+
+_checkbox_command_map = None
+
+
 class ViPile(urwid.Pile):
+    commands = (('up', urwid.CURSOR_UP), ('down', urwid.CURSOR_DOWN))
+
     def __init__(self, key_bindings, widget_list, focus_item=None):
         """Pile with Vi-like navigation."""
         super(ViPile, self).__init__(widget_list, focus_item)
-
-        command_map = urwid.command_map.copy()
-
-        keys = key_bindings.get_key_binding('up')
-        for key in keys:
-            command_map[key] = urwid.CURSOR_UP
-        keys = key_bindings.get_key_binding('down')
-        for key in keys:
-            command_map[key] = urwid.CURSOR_DOWN
-
-        self._command_map = command_map
+        self._command_map = vi_command_map(key_bindings, self.commands)
 
 
 class ViCheckbox(urwid.CheckBox):
@@ -24,37 +35,24 @@ class ViCheckbox(urwid.CheckBox):
         """Pile with Vi-like navigation."""
         super(ViCheckbox, self).__init__(*args, **kwargs)
 
-        command_map = urwid.command_map.copy()
-        command_map['x'] = 'activate'
-        self._command_map = command_map
+        global _checkbox_command_map
+        if _checkbox_command_map is None:
+            _checkbox_command_map = urwid.command_map.copy()
+            _checkbox_command_map['x'] = 'activate'
+        self._command_map = _checkbox_command_map
 
 
 class ViColumns(urwid.Columns):
+    commands = (('right', urwid.CURSOR_RIGHT), ('left', urwid.CURSOR_LEFT))
+
     def __init__(self, key_bindings, widget_list, dividechars=0, focus_column=None, min_width=1, box_columns=None):
         super(ViColumns, self).__init__(widget_list, dividechars, focus_column, min_width, box_columns)
-        command_map = urwid.command_map.copy()
-
-        keys = key_bindings.get_key_binding('right')
-        for key in keys:
-            command_map[key] = urwid.CURSOR_RIGHT
-        keys = key_bindings.get_key_binding('left')
-        for key in keys:
-            command_map[key] = urwid.CURSOR_LEFT
-
-        self._command_map = command_map
+        self._command_map = vi_command_map(key_bindings, self.commands)
 
 
 class ViListBox(urwid.ListBox):
+    commands = (('down', urwid.CURSOR_DOWN), ('up', urwid.CURSOR_UP))
+
     def __init__(self, key_bindings, *args, **kwargs):
         super(ViListBox, self).__init__(*args, **kwargs)
-        command_map = urwid.command_map.copy()
-
-        keys = key_bindings.get_key_binding('down')
-        for key in keys:
-            command_map[key] = urwid.CURSOR_DOWN
-        keys = key_bindings.get_key_binding('up')
-        for key in keys:
-            command_map[key] = urwid.CURSOR_UP
-
-        self._command_map = command_map
-
+        self._command_map = vi_command_map(key_bindings, self.commands)
@@ -0,0 +1,160 @@
+# coding=utf-8
+import urwid
+
+
+class TodoListWalker(urwid.ListWalker):
+    """
+    ListWalker over a list of row entries (todos and tree headers) that only
+    builds widgets on demand.
+
+    make_widget(entry) is called the first time the ListBox asks for a row.
+    Widgets are kept while they are within margin rows of the focus and
+    dropped as the focus moves on, so a 50k item list costs a list of
+    entries instead of 50k widget trees.
+    """
+    margin = 100
+
+    def __init__(self, make_widget, entries=None):
+        self.make_widget = make_widget
+        self.entries = list(entries or [])
+        self.focus = 0
+        self._widgets = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.entries)
+        if not 0 <= index < len(self.entries):
+            raise IndexError(index)
+        return self.widget_at(index)
+
+    def __delitem__(self, index):
+        self.pop(index)
+
+    def widget_at(self, index):
+        widget = self._widgets.get(index)
+        if widget is None:
+            widget = self._widgets[index] = self.make_widget(self.entries[index])
+        return widget
+
+    def widgets(self):
+        """The widgets that have been built, in no particular order"""
+        return list(self._widgets.values())
+
+    def index(self, entry):
+        return self.entries.index(entry)
+
+    def set_entries(self, entries):
+        self.entries = list(entries)
+        self._widgets = {}
+        self.focus = max(0, min(self.focus, len(self.entries) - 1))
+        self._modified()
+
+    def reconcile(self, entries):
+        """
+        Switch to a new list of entries, keeping the widgets of the entries
+        that are still shown and the focus on the same entry. Todos are
+        matched by identity and headers by value. Only the span between the
+        common prefix and suffix is looked at, so swapping two adjacent
+        todos touches two rows. Returns the number of new rows in that span.
+        """
+        old, new = self.entries, list(entries)
+        start = 0
+        end = min(len(old), len(new))
+        while start < end and old[start] == new[start]:
+            start += 1
+        old_end, new_end = len(old), len(new)
+        while old_end > start and new_end > start and old[old_end - 1] == new[new_end - 1]:
+            old_end -= 1
+            new_end -= 1
+        shift = new_end - old_end
+
+        moved = {}
+        for index, widget in self._widgets.items():
+            if start <= index < old_end:
+                moved[old[index]] = widget
+        positions = dict((entry, index) for index, entry in enumerate(new[start:new_end], start))
+
+        widgets = {}
+        for index, widget in self._widgets.items():
+            if index < start:
+                widgets[index] = widget
+            elif index >= old_end:
+                widgets[index + shift] = widget
+        for entry, widget in moved.items():
+            if entry in positions:
+                widgets[positions[entry]] = widget
+
+        focus = self.focus
+        if focus >= old_end:
+            focus += shift
+        elif focus >= start:
+            focus = positions.get(old[focus], focus)
+        self.entries = new
+        self._widgets = widgets
+        self.focus = max(0, min(focus, len(new) - 1))
+        self._modified()
+        return new_end - start
+
+    def extend(self, entries):
+        self.entries.extend(entries)
+        self._modified()
+
+    def append(self, entry):
+        self.extend([entry])
+
+    def pop(self, index=-1):
+        if index < 0:
+            index += len(self.entries)
+        entry = self.entries.pop(index)
+        self._widgets = dict(
+            (i if i < index else i - 1, w) for i, w in self._widgets.items() if i != index)
+        if self.focus > index or self.focus >= len(self.entries):
+            self.focus = max(0, self.focus - 1)
+        self._modified()
+        return entry
+
+    def _prune(self):
+        if len(self._widgets) > 4 * self.margin:
+            low, high = self.focus - self.margin, self.focus + self.margin
+            self._widgets = dict((i, w) for i, w in self._widgets.items() if low <= i <= high)
+
+    # urwid.ListWalker interface
+
+    def get_focus(self):
+        if not self.entries:
+            return None, None
+        return self.widget_at(self.focus), self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._prune()
+        self._modified()
+
+    def get_next(self, position):
+        return self._get(position + 1)
+
+    def get_prev(self, position):
+        return self._get(position - 1)
+
+    def _get(self, position):
+        if not 0 <= position < len(self.entries):
+            return None, None
+        return self.widget_at(position), position
+
+    def next_position(self, position):
+        if position + 1 >= len(self.entries):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse=False):
+        if reverse:
+            return range(len(self.entries) - 1, -1, -1)
+        return range(len(self.entries))